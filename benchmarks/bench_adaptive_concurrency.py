@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Fixed vs AIMD adaptive concurrency against the throttling fake
+OpenAI server: throughput, 429s and the limiter's window.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from simulate_response import run_all_survey_responses_json
+from llm_backends import OpenAIBackend
+from rate_limit import AdaptiveConcurrencyLimiter
+from fake_openai_server import FakeOpenAIServer
+from bench_batch_prompting import make_participant_pool
+
+
+def run_mode(name, server, pool_path, template, survey_context, concurrency, limiter=None, sdk_retries=2):
+    backend = OpenAIBackend(api_key="fake", base_url=server.base_url, max_retries=sdk_retries)
+    before = server.stats()
+    start = time.perf_counter()
+    error = None
+    completed = 0
+    try:
+        df = run_all_survey_responses_json(
+            backend, pool_path, template, survey_context,
+            max_concurrency=concurrency, limiter=limiter
+        )
+        completed = len(df)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    wall = time.perf_counter() - start
+    after = server.stats()
+    result = {
+        "mode": name,
+        "completed": completed,
+        "error": error,
+        "wall_seconds": round(wall, 3),
+        "personas_per_second": round(completed / wall, 2),
+        "server_requests": after["requests"] - before["requests"],
+        "server_429s": after["throttled"] - before["throttled"],
+        "server_max_in_flight": after["max_in_flight"],
+    }
+    if limiter is not None:
+        result["limiter"] = limiter.metrics()
+        result["window_trace"] = [limit for _, limit in limiter.history]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AIMD adaptive concurrency against a throttling server")
+    parser.add_argument("--participants", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=12, help="fake server concurrent capacity")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--fixed-concurrency", type=int, default=48)
+    parser.add_argument("--max-limit", type=int, default=64)
+    args = parser.parse_args()
+
+    template_path = os.path.join(ROOT, "simulate_response", "survey_response_template.txt")
+    with open(template_path, "r") as f:
+        template = f.read()
+    with open(os.path.join(ROOT, "simulate_response", "test_survey.json"), "r") as f:
+        context = json.load(f)
+    survey_context = json.dumps(context.get("revised_survey", context))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pool_path = os.path.join(tmp, "pool.csv")
+        make_participant_pool(pool_path, args.participants)
+        # A fresh server per mode so max_in_flight is per run.
+        for name, concurrency, limiter, sdk_retries in [
+            ("fixed_at_capacity", args.capacity, None, 2),
+            ("fixed_oversubscribed", args.fixed_concurrency, None, 2),
+            ("adaptive", args.fixed_concurrency, AdaptiveConcurrencyLimiter(max_limit=args.max_limit), 0),
+        ]:
+            with FakeOpenAIServer(capacity=args.capacity, latency=args.latency, retry_after=0.2) as server:
+                results.append(run_mode(name, server, pool_path, template, survey_context,
+                                        concurrency, limiter, sdk_retries))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Throughput and recovery rate of AnswerParser versus plain json.loads
+on synthetic LLM outputs (clean, fenced, chatty, truncated, option text, garbage).
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+
+from answer_parser import AnswerParser
+
+STYLES = ["clean", "fenced", "chatty", "truncated", "option_text", "garbage"]
+STYLE_WEIGHTS = [0.6, 0.15, 0.1, 0.05, 0.05, 0.05]
+
+
+def synthetic_responses(questions, n, seed=0):
+    """Return (responses, truth, styles) where truth is an (n, Q) array of option numbers."""
+    rng = np.random.default_rng(seed)
+    n_options = [len(q["input_config"]["options"]) for q in questions]
+    truth = np.stack([rng.integers(1, k + 1, size=n) for k in n_options], axis=1)
+    styles = rng.choice(len(STYLES), size=n, p=STYLE_WEIGHTS)
+    responses = []
+    for row, style in zip(truth, styles):
+        answers = {f"Q{i+1}": int(v) for i, v in enumerate(row)}
+        text = json.dumps(answers, indent=2)
+        style = STYLES[style]
+        if style == "fenced":
+            text = f"```json\n{text}\n```"
+        elif style == "chatty":
+            text = f"Sure! Here are my answers as that respondent:\n{text}\nLet me know if you need anything else."
+        elif style == "truncated":
+            text = text[:int(len(text) * 0.8)]
+        elif style == "option_text":
+            text = json.dumps({
+                key: questions[i]["input_config"]["options"][value - 1]
+                for i, (key, value) in enumerate(answers.items())
+            })
+        elif style == "garbage":
+            text = "I'm sorry, I can't answer that."
+        responses.append(text)
+    return responses, truth, [STYLES[s] for s in styles]
+
+
+def json_loads_baseline(responses):
+    parsed = []
+    for resp in responses:
+        try:
+            parsed.append(json.loads(resp))
+        except json.JSONDecodeError:
+            parsed.append({})
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AnswerParser on synthetic LLM output")
+    parser.add_argument("--responses", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "simulate_response", "test_survey.json")) as f:
+        questions = json.load(f)["questions"]
+    keys = [f"Q{i+1}" for i in range(len(questions))]
+    responses, truth, styles = synthetic_responses(questions, args.responses)
+
+    start = time.perf_counter()
+    baseline = json_loads_baseline(responses)
+    baseline_seconds = time.perf_counter() - start
+
+    answer_parser = AnswerParser(questions)
+    start = time.perf_counter()
+    parsed, reask_queue = answer_parser.parse_many(responses)
+    parser_seconds = time.perf_counter() - start
+
+    def correct_cells(rows):
+        return int(sum(
+            sum(1 for j, key in enumerate(keys) if row.get(key) == truth[i, j])
+            for i, row in enumerate(rows)
+        ))
+
+    total_cells = truth.size
+    print(json.dumps({
+        "responses": args.responses,
+        "questions": len(questions),
+        "style_mix": dict(zip(STYLES, STYLE_WEIGHTS)),
+        "json_loads": {
+            "seconds": round(baseline_seconds, 3),
+            "responses_per_second": round(args.responses / baseline_seconds),
+            "correct_cell_rate": round(correct_cells(baseline) / total_cells, 4),
+        },
+        "answer_parser": {
+            "seconds": round(parser_seconds, 3),
+            "responses_per_second": round(args.responses / parser_seconds),
+            "correct_cell_rate": round(correct_cells(parsed) / total_cells, 4),
+            "reask_responses": len(reask_queue),
+            "reask_cells": sum(reask_queue.question_counts().values()),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Compare one-persona and batched multi-persona simulation:
+throughput, request count and answer-distribution drift.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+
+from simulate_response import run_all_survey_responses_json
+from llm_backends import MockBackend, OpenAIBackend
+
+
+def make_participant_pool(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "ParticipantID": [f"p{i:06d}" for i in range(n)],
+        "Race": rng.choice(["White", "Black", "Asian", "Indigenous", "Latino"], size=n),
+        "Gender": rng.choice(["Male", "Female"], size=n),
+        "Age": rng.integers(18, 66, size=n),
+    }).to_csv(path, index=False)
+
+
+def answer_matrix(df, n_questions):
+    """Parse the Response column into a (participants, questions) array, NaN where missing."""
+    rows = []
+    for resp in df["Response"]:
+        try:
+            answers = json.loads(resp)
+        except (TypeError, ValueError):
+            answers = {}
+        rows.append([answers.get(f"Q{i+1}", np.nan) for i in range(n_questions)])
+    return np.asarray(rows, dtype=float)
+
+
+def distribution_drift(a, b, n_options):
+    """Mean absolute difference of per-question means and mean total variation distance."""
+    mean_diff = np.nanmean(np.abs(np.nanmean(a, axis=0) - np.nanmean(b, axis=0)))
+    tvd = []
+    for q in range(a.shape[1]):
+        pa = np.bincount(a[~np.isnan(a[:, q]), q].astype(int), minlength=n_options + 1)
+        pb = np.bincount(b[~np.isnan(b[:, q]), q].astype(int), minlength=n_options + 1)
+        tvd.append(0.5 * np.abs(pa / max(pa.sum(), 1) - pb / max(pb.sum(), 1)).sum())
+    return float(mean_diff), float(np.mean(tvd))
+
+
+def run_mode(llm, pool_path, template, survey_context, batch_size, concurrency):
+    requests_before = llm.stats.calls
+    start = time.perf_counter()
+    df = run_all_survey_responses_json(
+        llm, pool_path, template, survey_context,
+        max_concurrency=concurrency, batch_size=batch_size
+    )
+    wall = time.perf_counter() - start
+    return df, {
+        "batch_size": batch_size,
+        "wall_seconds": round(wall, 3),
+        "personas_per_second": round(len(df) / wall, 2),
+        "requests": llm.stats.calls - requests_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched multi-persona prompting")
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM base latency per request (s)")
+    parser.add_argument("--live", action="store_true", help="Use the OpenAI backend instead of the mock LLM")
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "simulate_response", "survey_response_template.txt")) as f:
+        template = f.read()
+    with open(os.path.join(ROOT, "simulate_response", "test_survey.json")) as f:
+        survey_context = f.read()
+    questions = json.loads(survey_context)["questions"]
+    n_options = max(len(q["input_config"]["options"]) for q in questions)
+
+    if args.live:
+        # Batched replies carry N answer objects, so allow more output tokens than the default.
+        llm = OpenAIBackend(max_tokens=30 * len(questions) * args.batch_size)
+    else:
+        llm = MockBackend(latency=args.latency, per_persona_latency=0.01, batch_error_rate=0.02)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool_path = os.path.join(tmp, "participant_pool.csv")
+        make_participant_pool(pool_path, args.participants)
+        single_df, single = run_mode(llm, pool_path, template, survey_context, 1, args.concurrency)
+        batch_df, batched = run_mode(llm, pool_path, template, survey_context, args.batch_size, args.concurrency)
+
+    mean_diff, tvd = distribution_drift(
+        answer_matrix(single_df, len(questions)), answer_matrix(batch_df, len(questions)), n_options
+    )
+    batching_effective = args.batch_size == 1 or batched["requests"] < args.participants
+    print(json.dumps({
+        "participants": args.participants,
+        "questions": len(questions),
+        "concurrency": args.concurrency,
+        "single": single,
+        "batched": batched,
+        "speedup": round(single["wall_seconds"] / batched["wall_seconds"], 2),
+        "drift": {"mean_abs_diff_of_means": mean_diff, "mean_total_variation": tvd},
+        "batching_effective": batching_effective,
+    }, indent=2))
+    if not batching_effective:
+        # every batch fell back to single-persona requests
+        sys.exit(f"batched mode made {batched['requests']} requests for {args.participants} personas")
+
+
+if __name__ == "__main__":
+    main()
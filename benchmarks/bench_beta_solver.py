@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+β solvers for the debias factor model: the 500-epoch Adam loop
+versus the L-BFGS-B dual solver. Reports wall time, the
+objective both minimize, distance to the Adam β and held-out
+(k-fold) error of the bias estimates.
+
+Without torch installed, the Adam loop is replayed by a NumPy copy of the
+same update rule (reported as "adam_numpy"):
+
+    python benchmarks/bench_beta_solver.py --repeats 5 --folds 5
+
+L-BFGS-B minimizes a hinge surrogate of the Adam loss, so it is accepted
+only within --tolerance of Adam: β relative difference at most the
+tolerance, and held-out MSE at most (1 + tolerance) × Adam's. The script
+exits non-zero otherwise; "adam" stays the default solver until it passes.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "debias"))
+
+from debias import choose_components, fit_factor_analysis, fit_beta_with_penalty, fit_beta_lbfgs
+
+try:
+    import torch  # noqa: F401
+    HAVE_TORCH = True
+except ImportError:
+    HAVE_TORCH = False
+
+
+def adam_numpy(F, delta, penalty_weight, lr, epochs):
+    """float32 NumPy replay of fit_beta_with_penalty (same loss, mask and Adam defaults)."""
+    F = np.asarray(F, dtype=np.float32)
+    delta = np.asarray(delta, dtype=np.float32)
+    beta = np.zeros(F.shape[1], dtype=np.float32)
+    m = np.zeros_like(beta)
+    v = np.zeros_like(beta)
+    for t in range(1, epochs + 1):
+        pred = F @ beta
+        residual = delta - pred
+        mask = (delta * pred < 0).astype(np.float32)
+        grad = (-2 * F.T @ residual - penalty_weight * F.T @ (mask * np.sign(residual))) / len(delta)
+        m = 0.9 * m + 0.1 * grad
+        v = 0.999 * v + 0.001 * grad * grad
+        beta = beta - lr * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+    return beta
+
+
+def objective(F, delta, beta, penalty_weight):
+    pred = F @ beta
+    return float(np.mean((delta - pred) ** 2) + penalty_weight * np.mean(np.maximum(0.0, -np.sign(delta) * pred)))
+
+
+def solvers(args):
+    adam = fit_beta_with_penalty if HAVE_TORCH else adam_numpy
+    return {
+        "adam_torch" if HAVE_TORCH else "adam_numpy":
+            lambda F, d: adam(F, d, penalty_weight=args.penalty, lr=args.lr, epochs=args.epochs),
+        "lbfgs": lambda F, d: fit_beta_lbfgs(F, d, penalty_weight=args.penalty),
+    }
+
+
+def factor_scores(X_train, X_test, variance_threshold):
+    k, _ = choose_components(X_train, variance_threshold)
+    F_train, fa = fit_factor_analysis(X_train, k)
+    return F_train, fa.transform(X_test)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark β solvers for the debias factor model")
+    parser.add_argument("--pickle", default=os.path.join(ROOT, "debias", "survey_with_embeddings.pkl"))
+    parser.add_argument("--alpha", type=float, default=0.90, help="PCA variance threshold α")
+    parser.add_argument("--penalty", type=float, default=15.0, help="directional penalty λ")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="allowed relative β difference and held-out MSE excess of lbfgs vs adam")
+    args = parser.parse_args()
+
+    df = pd.read_pickle(args.pickle)
+    X = np.vstack(df["Embedding"].tolist())
+    delta = np.array(df["Average_LLM_Response"], dtype=float) - np.array(df["Average_Human_Response"], dtype=float)
+    F, _ = factor_scores(X, X, args.alpha)
+    fits = solvers(args)
+
+    results = {"questions": len(df), "components": F.shape[1], "torch": HAVE_TORCH, "solvers": {}}
+    betas = {}
+    for name, fit in fits.items():
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            beta = fit(F, delta)
+            times.append(time.perf_counter() - start)
+        betas[name] = np.asarray(beta, dtype=float)
+        results["solvers"][name] = {
+            "median_ms": round(1000 * float(np.median(times)), 3),
+            "objective": round(objective(F, delta, betas[name], args.penalty), 6),
+            "train_mse": round(float(np.mean((delta - F @ betas[name]) ** 2)), 6),
+        }
+
+    reference = next(iter(betas))
+    for name, beta in betas.items():
+        results["solvers"][name]["beta_rel_diff_vs_adam"] = round(
+            float(np.linalg.norm(beta - betas[reference]) / np.linalg.norm(betas[reference])), 6
+        )
+
+    # Held-out quality: refit FA and β per fold, score the bias estimates on the held-out questions.
+    held_out = {name: {"mse": [], "sign_agreement": []} for name in fits}
+    for train, test in KFold(args.folds, shuffle=True, random_state=args.seed).split(X):
+        F_train, F_test = factor_scores(X[train], X[test], args.alpha)
+        for name, fit in fits.items():
+            pred = F_test @ np.asarray(fit(F_train, delta[train]), dtype=float)
+            held_out[name]["mse"].append(np.mean((delta[test] - pred) ** 2))
+            held_out[name]["sign_agreement"].append(np.mean(np.sign(pred) == np.sign(delta[test])))
+    for name, scores in held_out.items():
+        results["solvers"][name]["heldout_mse"] = round(float(np.mean(scores["mse"])), 6)
+        results["solvers"][name]["heldout_sign_agreement"] = round(float(np.mean(scores["sign_agreement"])), 4)
+    results["mse_predict_zero"] = round(float(np.mean(delta ** 2)), 6)
+
+    lbfgs, adam = results["solvers"]["lbfgs"], results["solvers"][reference]
+    results["tolerance"] = args.tolerance
+    results["lbfgs_within_tolerance"] = (
+        lbfgs["beta_rel_diff_vs_adam"] <= args.tolerance
+        and lbfgs["heldout_mse"] <= (1 + args.tolerance) * adam["heldout_mse"]
+    )
+    print(json.dumps(results, indent=2))
+    if not results["lbfgs_within_tolerance"]:
+        sys.exit(f"lbfgs differs from {reference} by more than {args.tolerance:g}: "
+                 f"beta_rel_diff {lbfgs['beta_rel_diff_vs_adam']}, "
+                 f"heldout_mse {lbfgs['heldout_mse']} vs {adam['heldout_mse']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Startup cost of the server and CLI entry modules, from the
+`python -X importtime` profile of a fresh interpreter. Each
+module must import within --budget-ms and must not pull in the
+dependencies that are deferred until first use (crewai, boto3,
+the debias stack with sklearn/scipy/torch, the PDF knowledge base).
+
+Exits non-zero when a module is over budget, imports a deferred dependency or
+fails to import, so it can gate CI:
+
+    python benchmarks/bench_import_time.py --budget-ms 2000 --repeats 5
+'''
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["server", "survey_logic", "survey"]
+DEFERRED = ["crewai", "boto3", "botocore", "torch", "sklearn", "scipy", "debias.debias", "knowledge_sources"]
+
+# "import time:       412 |       1385 |   pandas.core"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+
+def parse_importtime(stderr):
+    """
+    stderr: text written by `python -X importtime`
+    returns: list of (module, self_us, cumulative_us, depth) in the order printed
+    """
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def profile_import(module, python=sys.executable):
+    """
+    module: module name importable from the repository root
+    python: interpreter to profile
+    returns: (rows from parse_importtime, stderr tail or None when the import succeeded)
+    """
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                          capture_output=True, text=True)
+    error = None
+    if proc.returncode != 0:
+        error = [line for line in proc.stderr.splitlines() if not IMPORTTIME_LINE.match(line)][-1:]
+        error = error[0] if error else f"exit status {proc.returncode}"
+    return parse_importtime(proc.stderr), error
+
+
+def import_subtree(rows, module):
+    """
+    rows: parse_importtime output
+    module: module imported by the profiled `-c "import <module>"`
+    returns: the rows of that import and everything it imported (children are
+             printed before their parent), excluding interpreter startup
+    """
+    end = max(i for i, (name, _, _, depth) in enumerate(rows) if name == module and depth == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def summarize(module, runs, args):
+    """
+    module: profiled module name
+    runs: list of parse_importtime results, one per fresh interpreter
+    returns: dict with the median startup time, the heaviest imports and any deferred modules loaded
+    """
+    subtrees = [import_subtree(rows, module) for rows in runs]
+    totals = [rows[-1][2] for rows in subtrees]
+    rows = subtrees[totals.index(sorted(totals)[len(totals) // 2])]
+    imported = {name for name, *_ in rows}
+    deferred = sorted(name for name in DEFERRED if name in imported and name != module)
+    top_level = sorted(((name, cumulative) for name, _, cumulative, depth in rows if depth == 1),
+                       key=lambda row: -row[1])
+    heaviest = sorted(((name, self_us) for name, self_us, *_ in rows), key=lambda row: -row[1])
+    return {
+        "startup_ms": round(statistics.median(totals) / 1000, 1),
+        "modules_imported": len(rows),
+        "deferred_imported": deferred,
+        "over_budget": statistics.median(totals) / 1000 > args.budget_ms,
+        "top_imports_cumulative_ms": {name: round(us / 1000, 1) for name, us in top_level[:args.top]},
+        "top_imports_self_ms": {name: round(us / 1000, 1) for name, us in heaviest[:args.top]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile entry-module import time against a startup budget")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import from the repo root")
+    parser.add_argument("--budget-ms", type=float, default=2000.0, help="maximum median import time per module")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per module (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to profile")
+    args = parser.parse_args()
+
+    results = {"budget_ms": args.budget_ms, "modules": {}}
+    failed = False
+    for module in args.modules:
+        runs = []
+        for _ in range(args.repeats):
+            rows, error = profile_import(module, args.python)
+            if error:
+                break
+            runs.append(rows)
+        if error:
+            results["modules"][module] = {"error": error}
+            failed = True
+            continue
+        summary = summarize(module, runs, args)
+        results["modules"][module] = summary
+        failed |= summary["over_budget"] or bool(summary["deferred_imported"])
+
+    results["passed"] = not failed
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
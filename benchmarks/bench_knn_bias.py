@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Nearest-neighbour bias lookup versus the FA/β factor model.
+
+Quality: k-fold over the GSS reference questions (pickle, or --bank), every
+estimator refit on the training folds and scored on the held-out questions.
+Latency: synthetic clustered banks of --bank-sizes rows, exact (flat) and IVF
+search for single queries and query batches, with IVF recall@k against flat.
+
+    python benchmarks/bench_knn_bias.py --bank-sizes 10000 100000 --folds 5
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "debias"))
+
+from debias import fit_factor_model, fit_beta_lbfgs
+from debias_model import DebiasModel
+from knn_bias import KNNBiasEstimator, FlatIndex, IVFIndex
+from reference_bank import ReferenceBank
+
+
+def load_reference(args):
+    if args.bank:
+        bank = ReferenceBank.load(args.bank)
+        return np.asarray(bank.embeddings, dtype=float), bank.delta
+    df = pd.read_pickle(args.pickle)
+    delta = np.array(df["Average_LLM_Response"], dtype=float) - np.array(df["Average_Human_Response"], dtype=float)
+    return np.vstack(df["Embedding"].tolist()), delta
+
+
+def held_out_quality(X, delta, args):
+    estimators = {"factor_model": None, **{f"knn_k{k}": k for k in args.k}}
+    scores = {name: {"mse": [], "mae": [], "sign_agreement": []} for name in ["predict_zero", "predict_train_mean",
+                                                                              *estimators]}
+    for train, test in KFold(args.folds, shuffle=True, random_state=args.seed).split(X):
+        predictions = {
+            "predict_zero": np.zeros(len(test)),
+            "predict_train_mean": np.full(len(test), delta[train].mean()),
+        }
+        _, F, fa = fit_factor_model(X[train], args.alpha)
+        beta = fit_beta_lbfgs(F, delta[train], penalty_weight=args.penalty)
+        predictions["factor_model"] = DebiasModel.from_factor_analysis(fa, beta).estimate_bias(X[test])
+        for name, k in estimators.items():
+            if k is not None:
+                knn = KNNBiasEstimator(X[train], delta[train], k=k, temperature=args.temperature, index="flat")
+                predictions[name] = knn.estimate_bias(X[test])
+        for name, pred in predictions.items():
+            scores[name]["mse"].append(np.mean((delta[test] - pred) ** 2))
+            scores[name]["mae"].append(np.mean(np.abs(delta[test] - pred)))
+            scores[name]["sign_agreement"].append(np.mean(np.sign(pred) == np.sign(delta[test])))
+    return {name: {metric: round(float(np.mean(values)), 4) for metric, values in metrics.items()}
+            for name, metrics in scores.items()}
+
+
+def synthetic_bank(n, dim, rng, n_topics=None):
+    """Unit vectors around n_topics random topic directions, like clustered question embeddings."""
+    n_topics = n_topics or max(8, n // 200)
+    topics = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    X = topics[rng.integers(0, n_topics, n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    return X, rng.standard_normal(n)
+
+
+def latency(size, args, rng):
+    X, delta = synthetic_bank(size, args.dim, rng)
+    queries = X[rng.choice(size, args.queries, replace=False)] + 0.2 * rng.standard_normal((args.queries, args.dim),
+                                                                                           dtype=np.float32)
+    result = {"bank_size": size, "dim": args.dim}
+    start = time.perf_counter()
+    flat = FlatIndex(X)
+    result["flat_build_s"] = round(time.perf_counter() - start, 3)
+    start = time.perf_counter()
+    ivf = IVFIndex(X, n_probe=args.n_probe)
+    result["ivf_build_s"] = round(time.perf_counter() - start, 3)
+    result["ivf_lists"] = ivf.n_lists
+    result["ivf_probe"] = ivf.n_probe
+
+    for name, index in (("flat", flat), ("ivf", ivf)):
+        single = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query[None, :], args.k[-1])
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        _, ids = index.search(queries, args.k[-1])
+        batch = time.perf_counter() - start
+        result[f"{name}_single_p50_ms"] = round(1000 * float(np.percentile(single, 50)), 3)
+        result[f"{name}_single_p95_ms"] = round(1000 * float(np.percentile(single, 95)), 3)
+        result[f"{name}_batch_{args.queries}_ms"] = round(1000 * batch, 3)
+        if name == "flat":
+            exact = ids
+        else:
+            result[f"ivf_recall_at_{args.k[-1]}"] = round(float(np.mean(
+                [len(set(a) & set(b)) / len(a) for a, b in zip(exact, ids)]
+            )), 4)
+
+    # Reference point: the factor model's δ̂ is one matvec over the query batch.
+    weights = rng.standard_normal(args.dim)
+    start = time.perf_counter()
+    queries.astype(float) @ weights
+    result[f"factor_model_batch_{args.queries}_ms"] = round(1000 * (time.perf_counter() - start), 3)
+    del X, delta, flat, ivf
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the kNN bias estimator against the factor model")
+    parser.add_argument("--pickle", default=os.path.join(ROOT, "debias", "survey_with_embeddings.pkl"))
+    parser.add_argument("--bank", help="reference bank directory to use instead of the pickle")
+    parser.add_argument("--alpha", type=float, default=0.90, help="PCA variance threshold α")
+    parser.add_argument("--penalty", type=float, default=15.0, help="directional penalty λ")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10, 20], help="neighbours to blend")
+    parser.add_argument("--temperature", type=float, default=0.05)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--bank-sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    X, delta = load_reference(args)
+    rng = np.random.default_rng(args.seed)
+    results = {
+        "reference_questions": len(delta),
+        "heldout": held_out_quality(X, delta, args),
+        "latency": [latency(size, args, rng) for size in args.bank_sizes],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
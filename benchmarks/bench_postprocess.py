@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Row-wise parse + DataFrame assembly versus chunked, process-parallel
+parsing into columnar blocks.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from answer_parser import AnswerParser
+from postprocess import parse_responses
+from bench_answer_parser import synthetic_responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark post-processing of simulated responses")
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--chunk-size", type=int, default=None, help="default: split evenly over the workers")
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "simulate_response", "test_survey.json")) as f:
+        questions = json.load(f)["questions"]
+    responses, _, _ = synthetic_responses(questions, args.responses)
+    ids = [f"p{i:07d}" for i in range(args.responses)]
+
+    start = time.perf_counter()
+    answer_parser = AnswerParser(questions)
+    parsed, _ = answer_parser.parse_many(responses, ids)
+    baseline_df = pd.DataFrame(parsed, columns=answer_parser.keys)
+    baseline_seconds = time.perf_counter() - start
+
+    results = {
+        "responses": args.responses,
+        "cpu_count": os.cpu_count(),
+        "rowwise_parse_many_dataframe": {
+            "seconds": round(baseline_seconds, 3),
+            "responses_per_second": round(args.responses / baseline_seconds),
+        },
+    }
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        columns, _ = parse_responses(questions, responses, ids, max_workers=workers, chunk_size=args.chunk_size)
+        df = pd.DataFrame(columns)
+        seconds = time.perf_counter() - start
+        same = bool(np.allclose(df.to_numpy(dtype=float), baseline_df.to_numpy(dtype=float), equal_nan=True))
+        results[f"columnar_workers_{workers}"] = {
+            "seconds": round(seconds, 3),
+            "responses_per_second": round(args.responses / seconds),
+            "speedup": round(baseline_seconds / seconds, 2),
+            "matches_rowwise": same,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+End-to-end simulation throughput sweep against the deterministic
+MockBackend: requests/s, latency percentiles, peak RSS and CPU time.
+
+Every configuration runs in a fresh spawned process so peak RSS and CPU time
+are per configuration. Results are printed (and optionally written) as JSON:
+
+    python benchmarks/bench_simulation.py --pool-sizes 200 1000 --questions 5 20 \
+        --concurrency 1 8 32 --batch-sizes 1 5 --output bench_simulation.json
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import resource
+import tempfile
+import multiprocessing
+import concurrent.futures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+sys.path.append(BENCH_DIR)
+
+OPTIONS = ["Strongly disagree", "Disagree", "Somewhat disagree", "Neutral",
+           "Somewhat agree", "Agree", "Strongly agree"]
+
+
+def make_survey(n_questions):
+    """Synthetic Likert survey context with `n_questions` questions."""
+    return {
+        "theme": "Synthetic benchmark survey",
+        "purpose": "Measure simulation throughput",
+        "questions": [
+            {
+                "question_text": f"Statement number {i + 1} describes me well.",
+                "input_type": "multiple_choice",
+                "input_config": {"options": OPTIONS},
+            }
+            for i in range(n_questions)
+        ],
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def run_config(config):
+    """Run one configuration in the current process and return its metrics."""
+    from llm_backends import MockBackend
+    from bench_batch_prompting import make_participant_pool
+
+    survey = make_survey(config["questions"])
+    with open(os.path.join(ROOT, "simulate_response", "survey_response_template.txt"), "r") as f:
+        template = f.read()
+    backend = MockBackend(latency=config["latency"], jitter=config["jitter"],
+                          per_persona_latency=config["per_persona_latency"], seed=config["seed"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool_path = os.path.join(tmp, "pool.csv")
+        make_participant_pool(pool_path, config["pool_size"], seed=config["seed"])
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if config["entry"] == "collect":
+            # Full survey_logic entry point (needs its dependencies, e.g. crewai, installed).
+            import survey_logic
+            template_path = os.path.join(tmp, "template.txt")
+            context_path = os.path.join(tmp, "survey.json")
+            with open(template_path, "w") as f:
+                f.write(template)
+            with open(context_path, "w") as f:
+                json.dump(survey, f)
+            matrix = survey_logic.collect_simulated_data(
+                template_path, context_path, pool_path, max_concurrency=config["concurrency"],
+                cache_path=None, batch_size=config["batch_size"], backend=backend
+            )
+        else:
+            # Same stages as collect_simulated_data: simulate, parse, pack into a ResponseMatrix.
+            from simulate_response import run_all_survey_responses_json
+            from postprocess import parse_responses
+            from response_matrix import ResponseMatrix
+            responses_df = run_all_survey_responses_json(
+                backend, pool_path, template, json.dumps(survey),
+                max_concurrency=config["concurrency"], batch_size=config["batch_size"]
+            )
+            columns, _ = parse_responses(survey["questions"], responses_df["Response"].tolist(),
+                                         responses_df["ParticipantID"].tolist())
+            matrix = ResponseMatrix.from_columns(columns, responses_df["ParticipantID"].to_numpy())
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    stats = backend.stats.summary()
+    return {
+        **config,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "requests": stats["calls"],
+        "requests_per_second": round(stats["calls"] / wall, 2),
+        "personas_per_second": round(matrix.n_participants / wall, 2),
+        "latency_p50_ms": round(stats.get("latency_p50", 0) * 1000, 2),
+        "latency_p95_ms": round(stats.get("latency_p95", 0) * 1000, 2),
+        "latency_p99_ms": round(stats.get("latency_p99", 0) * 1000, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "missing_cells": int(matrix.missing_mask().sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep simulation throughput against a mock LLM")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--questions", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--latency", type=float, default=0.01, help="mock seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.3, help="mock relative latency jitter")
+    parser.add_argument("--per-persona-latency", type=float, default=0.002)
+    parser.add_argument("--entry", choices=["runner", "collect"], default="runner",
+                        help="'collect' drives survey_logic.collect_simulated_data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this path")
+    args = parser.parse_args()
+
+    configs = [
+        {
+            "entry": args.entry, "pool_size": pool_size, "questions": questions,
+            "concurrency": concurrency, "batch_size": batch_size, "latency": args.latency,
+            "jitter": args.jitter, "per_persona_latency": args.per_persona_latency, "seed": args.seed,
+        }
+        for pool_size, questions, concurrency, batch_size in itertools.product(
+            args.pool_sizes, args.questions, args.concurrency, args.batch_sizes
+        )
+    ]
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for config in configs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(run_config, config).result())
+        print(f"{config} done", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
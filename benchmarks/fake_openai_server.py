@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Local OpenAI-compatible server that injects throttling, for
+exercising rate limiting and retries without a real API key.
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "simulate_response"))
+
+from llm_backends import MockBackend
+
+
+class FakeOpenAIServer:
+    """
+    Serves /v1/chat/completions and /v1/embeddings on a background thread.
+
+    Chat answers come from MockBackend (so survey prompts get valid answer
+    objects and `n` returns distinct samples); embeddings are deterministic
+    unit vectors seeded by a hash of the text. Requests beyond `capacity`
+    in flight, or beyond `requests_per_second`, are rejected with 429 and a
+    Retry-After header; `error_rate` injects random 503s. Latency grows with
+    load so a saturated server also looks slower. GET /stats returns counters.
+
+    Args:
+        host: interface to bind.
+        port: port to bind (0 picks a free one).
+        capacity: concurrent requests served before throttling.
+        requests_per_second: optional sustained request rate before throttling.
+        latency: base seconds per request.
+        retry_after: Retry-After seconds sent with 429s (None omits the header).
+        error_rate: probability of a 503 response.
+        embedding_dim: default embedding size.
+        seed: seed for answers, embeddings and injected errors.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, capacity=8, requests_per_second=None, latency=0.05,
+                 retry_after=0.5, error_rate=0.0, embedding_dim=1536, seed=0):
+        self.capacity = capacity
+        self.requests_per_second = requests_per_second
+        self.latency = latency
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.embedding_dim = embedding_dim
+        self.seed = seed
+        self.mock = MockBackend(seed=seed)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.counters = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "max_in_flight": 0,
+                         "embedded_texts": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _admit(self):
+        """Return None to serve the request, or the HTTP status to reject it with."""
+        with self._lock:
+            self.counters["requests"] += 1
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            over_rate = self.requests_per_second is not None and self._window_count >= self.requests_per_second
+            if self._in_flight >= self.capacity or over_rate:
+                self.counters["throttled"] += 1
+                return 429
+            if self._random.random() < self.error_rate:
+                self.counters["errors"] += 1
+                return 503
+            self._window_count += 1
+            self._in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self._in_flight)
+            return None
+
+    def _load(self):
+        with self._lock:
+            return self._in_flight / max(self.capacity, 1)
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.counters["ok"] += 1
+
+    def _embedding(self, text, dim):
+        digest = hashlib.sha256(f"{self.seed}|{text}".encode("utf-8")).digest()
+        vector = np.random.default_rng(int.from_bytes(digest[:8], "big")).standard_normal(dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _chat(self, body):
+        prompt = body["messages"][-1]["content"]
+        n = int(body.get("n") or 1)
+        choices = [
+            {"index": i, "finish_reason": "stop",
+             "message": {"role": "assistant", "content": self.mock._respond(prompt, i)[0]}}
+            for i in range(n)
+        ]
+        completion_tokens = sum(len(c["message"]["content"]) // 4 for c in choices)
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"), "choices": choices,
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": completion_tokens,
+                      "total_tokens": len(prompt) // 4 + completion_tokens},
+        }
+
+    def _embeddings(self, body):
+        texts = body["input"]
+        if isinstance(texts, str):
+            texts = [texts]
+        dim = int(body.get("dimensions") or self.embedding_dim)
+        with self._lock:
+            self.counters["embedded_texts"] += len(texts)
+        tokens = sum(len(t) // 4 for t in texts)
+        return {
+            "object": "list", "model": body.get("model", "fake"),
+            "data": [{"object": "embedding", "index": i, "embedding": self._embedding(t, dim)}
+                     for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the request (e.g. a cancelled run).
+                    pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    self._send(200, server.stats())
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except ValueError:
+                    body = {}
+                if not isinstance(body, dict) or not ("messages" in body or "input" in body):
+                    self._send(400, {"error": {"message": "invalid request body"}})
+                    return
+                if self.path.endswith("/chat/completions"):
+                    respond = server._chat
+                elif self.path.endswith("/embeddings"):
+                    respond = server._embeddings
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                status = server._admit()
+                if status == 429:
+                    headers = {} if server.retry_after is None else {"Retry-After": str(server.retry_after)}
+                    self._send(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}}, headers)
+                    return
+                if status is not None:
+                    self._send(status, {"error": {"message": "Service unavailable", "type": "server_error"}})
+                    return
+                try:
+                    payload = respond(body)
+                    time.sleep(server.latency * (1 + server._load()))
+                finally:
+                    server._done()
+                self._send(200, payload)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a throttling OpenAI-compatible fake server")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=None)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(port=args.port, capacity=args.capacity, requests_per_second=args.rps,
+                              latency=args.latency, retry_after=args.retry_after, error_rate=args.error_rate)
+    print(f"Serving on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,17 +19,46 @@ Writes:
   - an output JSON with an added "debiased_llm_resp" field per question.
 """
 import os
+import sys
 import json
+import asyncio
+import threading
 import argparse
 from typing import List, Union
 
 import numpy as np
 import pandas as pd
 from sklearn.decomposition import PCA, FactorAnalysis
-import torch
-import torch.optim as optim
+from scipy.optimize import minimize
 import openai
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulate_response"))
+from rate_limit import AdaptiveConcurrencyLimiter, run_coroutine_sync
+from response_matrix import ResponseMatrix
+try:
+    from .embedding_cache import EmbeddingCache, PICKLE_EMBED_MODEL, normalize_text
+    from .debias_model import DebiasModel, DEFAULT_MODEL_PATH, DEFAULT_PICKLE_PATH
+    from .reference_bank import ReferenceBank
+    from .knn_bias import KNNBiasEstimator
+except ImportError:
+    from embedding_cache import EmbeddingCache, PICKLE_EMBED_MODEL, normalize_text
+    from debias_model import DebiasModel, DEFAULT_MODEL_PATH, DEFAULT_PICKLE_PATH
+    from reference_bank import ReferenceBank
+    from knn_bias import KNNBiasEstimator
+
+# Cached PCA/FactorAnalysis fits of the training data (see fit_factor_model).
+DEFAULT_FIT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fit_cache")
+# Cached fits kept per cache directory; the least recently used are removed first.
+FIT_CACHE_MAX_ENTRIES = 8
+
+# Inputs/outputs with these suffixes are ResponseMatrix files instead of JSON.
+MATRIX_SUFFIXES = (".npz", ".arrow", ".feather")
+
+# Per-request limits for embedding batches (the API accepts up to 2048 inputs
+# and 300k tokens per request; stay well below both).
+EMBED_BATCH_SIZE = 256
+EMBED_BATCH_TOKENS = 100_000
+
 
 def get_embedding(text, model="text-embedding-3-small"):
     """
@@ -37,24 +66,110 @@ def get_embedding(text, model="text-embedding-3-small"):
     model: str, OpenAI embedding model name
     returns: list[float] embedding vector
     """
-    response = openai.embeddings.create(
-        input=[text],
-        model=model
-    )
-    return response.data[0].embedding
+    return get_embeddings([text], model=model)[0]
+
+
+def estimate_tokens(text):
+    """
+    text: str
+    returns: int, token count (tiktoken when installed, else ~4 characters per token)
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def make_embedding_batches(texts, max_inputs=EMBED_BATCH_SIZE, max_tokens=EMBED_BATCH_TOKENS):
+    """
+    texts: list[str]
+    max_inputs: int, most texts per request
+    max_tokens: int, most (estimated) tokens per request
+    returns: list of lists of indices into `texts`, in order; every batch respects
+             both limits (a single over-long text still gets a batch of its own)
+    """
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_inputs or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def get_embeddings(texts, model="text-embedding-3-small", limiter=None, cache=None):
+    """
+    texts: list[str]
+    model: str, OpenAI embedding model name
+    limiter: optional AdaptiveConcurrencyLimiter; requests run concurrently
+             inside its AIMD window and 429/timeout/5xx responses are retried
+    cache: optional EmbeddingCache; only texts missing from it are embedded
+           (each distinct normalized text once) and the new vectors are stored
+    Uncached texts are grouped into size- and token-bounded batches
+    (make_embedding_batches) that are sent concurrently.
+    returns: list of embedding vectors, in the order of `texts`
+    """
+    embeddings = cache.get_many(texts, model) if cache is not None else [None] * len(texts)
+    pending = {}
+    for i, vector in enumerate(embeddings):
+        if vector is None:
+            pending.setdefault(normalize_text(texts[i]), []).append(i)
+    if not pending:
+        return embeddings
+    unique_texts = list(pending)
+    fresh = run_coroutine_sync(_get_embeddings_async(unique_texts, model, limiter or AdaptiveConcurrencyLimiter(),
+                                                     make_embedding_batches(unique_texts)))
+    if cache is not None:
+        cache.put_many(unique_texts, fresh, model)
+    for text, vector in zip(unique_texts, fresh):
+        for i in pending[text]:
+            embeddings[i] = vector
+    return embeddings
+
+
+async def _get_embeddings_async(texts, model, limiter, batches):
+    # SDK retries are disabled so throttling reaches the limiter.
+    client = openai.AsyncOpenAI(api_key=openai.api_key or None, max_retries=0)
+    embeddings = [None] * len(texts)
 
-def choose_components(X, variance_threshold):
+    async def embed(batch):
+        response = await limiter.call(client.embeddings.create, input=[texts[i] for i in batch], model=model)
+        # scatter each result back to its text's position
+        for item in response.data:
+            embeddings[batch[item.index]] = item.embedding
+
+    try:
+        await asyncio.gather(*(embed(batch) for batch in batches))
+    finally:
+        await client.close()
+    return embeddings
+
+def choose_components(X, variance_threshold, svd_solver="full", max_components=256):
     """
     X: array-like, shape (n_samples, n_features)
     variance_threshold: float in (0, 1]
+    svd_solver: "full" (exact, all components) or "randomized" (truncated PCA for
+                large reference banks: fits max_components, doubling until the
+                threshold is reached)
+    max_components: int, initial number of components for the randomized solver
     returns: (k, pca)
       k: int, minimum # components whose cumulative explained variance ≥ threshold
       pca: fitted sklearn.decomposition.PCA instance
     """
-    pca = PCA()
-    pca.fit(X)
-    cumvar = np.cumsum(pca.explained_variance_ratio_)
-    k = int(np.searchsorted(cumvar, variance_threshold) + 1)
+    n_max = min(np.shape(X))
+    n_components = None if svd_solver == "full" else min(max_components, n_max)
+    while True:
+        pca = PCA(n_components=n_components, svd_solver=svd_solver, random_state=0)
+        pca.fit(X)
+        cumvar = np.cumsum(pca.explained_variance_ratio_)
+        if svd_solver == "full" or cumvar[-1] >= variance_threshold or n_components >= n_max:
+            break
+        n_components = min(2 * n_components, n_max)
+    k = int(min(np.searchsorted(cumvar, variance_threshold) + 1, len(cumvar)))
     return k, pca
 
 def fit_factor_analysis(X, n_components):
@@ -70,6 +185,70 @@ def fit_factor_analysis(X, n_components):
     return F, fa
 
 
+def fit_factor_model(X, variance_threshold, svd_solver="full", fingerprint=None, cache_dir=DEFAULT_FIT_CACHE_DIR):
+    """
+    choose_components + fit_factor_analysis, cached on disk. Neither fit depends on
+    the new questions, so they are reused until the training data changes.
+
+    X: array-like, shape (n_samples, n_features), the training embeddings
+    variance_threshold: float in (0, 1]
+    svd_solver: PCA solver for choose_components ("full" or "randomized")
+    fingerprint: str identifying the training data (e.g. the sha256 of the pickle);
+                 None disables the cache
+    cache_dir: folder for the cached fits (created if missing); None disables the cache.
+               It keeps the FIT_CACHE_MAX_ENTRIES most recently used fits, so fits
+               of different training sources (pickle, reference bank) coexist.
+    returns: (k, F, fa), as from choose_components and fit_factor_analysis
+    """
+    path = None
+    if fingerprint and cache_dir:
+        path = os.path.join(cache_dir, f"fa-{fingerprint[:16]}-{variance_threshold:g}-{svd_solver}.npz")
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as cached:
+                k = int(cached["k"])
+                fa = FactorAnalysis(n_components=k)
+                fa.components_ = cached["components"]
+                fa.mean_ = cached["mean"]
+                fa.noise_variance_ = cached["noise_variance"]
+                fa.n_features_in_ = fa.mean_.shape[0]
+                scores = cached["scores"]
+            os.utime(path)  # mark as recently used
+            return k, scores, fa
+
+    k, _ = choose_components(X, variance_threshold, svd_solver=svd_solver)
+    F, fa = fit_factor_analysis(X, k)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path[:-len(".npz")] + f".{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, k=k, components=fa.components_, mean=fa.mean_,
+                 noise_variance=fa.noise_variance_, scores=F)
+        os.replace(tmp_path, path)
+        prune_fit_cache(cache_dir)
+    return k, F, fa
+
+
+def prune_fit_cache(cache_dir=DEFAULT_FIT_CACHE_DIR, max_entries=FIT_CACHE_MAX_ENTRIES):
+    """
+    Remove the least recently used cached fits beyond `max_entries`.
+
+    cache_dir: folder of the cached fits
+    max_entries: int, number of fits to keep
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith("fa-") and name.endswith(".npz") and ".tmp." not in name:
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+    for _, path in sorted(entries, reverse=True)[max_entries:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
 def fit_beta_with_penalty(F, delta, penalty_weight, lr, epochs, device=None):
     """
     F: array-like of shape (n_samples, n_components)
@@ -84,6 +263,9 @@ def fit_beta_with_penalty(F, delta, penalty_weight, lr, epochs, device=None):
     beta: ndarray of shape (n_components,)
         The fitted coefficient vector.
     """
+    import torch
+    import torch.optim as optim
+
     # select device
     dev = device or ("cuda" if torch.cuda.is_available() else "cpu")
     dev = torch.device(dev)
@@ -110,6 +292,68 @@ def fit_beta_with_penalty(F, delta, penalty_weight, lr, epochs, device=None):
     return beta.detach().cpu().numpy()
 
 
+def fit_beta_lbfgs(F, delta, penalty_weight, tol=1e-9, max_iter=1000):
+    """
+    Exact minimizer of a convex surrogate of the fit_beta_with_penalty loss,
+
+        mean((δ − Fβ)²) + λ · mean(max(0, −sign(δ) · Fβ)).
+
+    On a sign mismatch the Adam loss charges mask·|δ − Fβ| = |δ| + |Fβ|; the
+    hinge keeps the |Fβ| slope but drops the |δ| jump at the sign boundary, so
+    the two optima differ (see benchmarks/bench_beta_solver.py). Opt-in via
+    solver="lbfgs"; "adam" stays the default.
+    For dual variables α ∈ [0, 1]ⁿ the inner problem has the closed form
+    β(α) = F⁺ (δ + λ/2 · sign(δ) ∘ α); the concave dual in α is maximized with
+    L-BFGS-B, then β = β(α*).
+
+    F: array-like of shape (n_samples, n_components)
+    delta: array-like of shape (n_samples,)
+    penalty_weight: float, weight for the sign‐mismatch penalty
+    tol: float, L-BFGS-B convergence tolerance on the dual objective and gradient
+    max_iter: int, iteration cap for L-BFGS-B
+
+    Returns
+    -------
+    beta: ndarray of shape (n_components,)
+        The fitted coefficient vector.
+    """
+    F = np.asarray(F, dtype=float)
+    delta = np.asarray(delta, dtype=float)
+    n = F.shape[0]
+    sign = np.sign(delta)
+    F_pinv = np.linalg.pinv(F)
+
+    def beta_of(alpha):
+        return F_pinv @ (delta + 0.5 * penalty_weight * sign * alpha)
+
+    def negative_dual(alpha):
+        pred = F @ beta_of(alpha)
+        value = np.mean((delta - pred) ** 2) - penalty_weight * np.mean(sign * alpha * pred)
+        # envelope theorem: d(dual)/dα_i = −λ/n · sign(δ_i) · pred_i
+        return -value, penalty_weight * sign * pred / n
+
+    result = minimize(
+        negative_dual, np.zeros(n), jac=True, method="L-BFGS-B", bounds=[(0.0, 1.0)] * n,
+        options={"ftol": tol, "gtol": tol, "maxiter": max_iter}
+    )
+    return beta_of(result.x)
+
+
+def estimate_bias(embedding, beta, fa):
+    """
+    embedding: array-like of shape (n_features,)
+    beta: array-like of shape (n_components,)
+    fa: fitted FactorAnalysis instance
+
+    Returns
+    -------
+    delta_hat: float, the estimated LLM bias for this question
+    """
+    x = np.asarray(embedding, dtype=float).reshape(1, -1)
+    F_new = fa.transform(x)            # shape (1, k)
+    return float(F_new.dot(beta)[0])   # scalar
+
+
 def debias_llm_responses(embedding, beta, fa, raw_llm_resps):
     """
     embedding: array-like of shape (n_features,)
@@ -122,15 +366,228 @@ def debias_llm_responses(embedding, beta, fa, raw_llm_resps):
     debiased: list of float
         Each raw response minus the single bias estimate.
     """
-    # compute factor score for this single embedding
-    x = np.asarray(embedding, dtype=float).reshape(1, -1)
-    F_new = fa.transform(x)            # shape (1, k)
-    delta_hat = float(F_new.dot(beta)) # scalar
+    # compute the bias estimate for this single embedding
+    delta_hat = estimate_bias(embedding, beta, fa)
 
     # subtract the same bias from every LLM response
     return [resp - delta_hat for resp in raw_llm_resps]
 
 
+def estimate_biases(embeddings, beta, fa):
+    """
+    embeddings: array-like of shape (n_questions, n_features)
+    beta: array-like of shape (n_components,)
+    fa: fitted FactorAnalysis instance
+
+    Returns
+    -------
+    delta_hat: ndarray of shape (n_questions,), one fa.transform and one matmul
+               for all questions
+    """
+    X = np.asarray(embeddings, dtype=float).reshape(-1, np.shape(fa.mean_)[0])
+    return fa.transform(X) @ np.asarray(beta, dtype=float)
+
+
+def subtract_biases(responses, deltas):
+    """
+    responses: list of response lists (ragged), one per question
+    deltas: array-like of shape (n_questions,)
+
+    Returns
+    -------
+    debiased: list of float lists; every response minus its question's δ̂, computed
+              as one subtraction over the flattened responses
+    """
+    if not len(responses):
+        return []
+    lengths = np.fromiter((len(resps) for resps in responses), dtype=np.intp, count=len(responses))
+    flat = np.fromiter((resp for resps in responses for resp in resps), dtype=float, count=int(lengths.sum()))
+    debiased = flat - np.repeat(np.asarray(deltas, dtype=float), lengths)
+    return [chunk.tolist() for chunk in np.split(debiased, np.cumsum(lengths)[:-1])]
+
+
+def debias_llm_responses_batch(embeddings, beta, fa, raw_llm_resps):
+    """
+    embeddings: array-like of shape (n_questions, n_features)
+    beta: array-like of shape (n_components,)
+    fa: fitted FactorAnalysis instance
+    raw_llm_resps: list of float lists, one per question (lengths may differ)
+
+    Returns
+    -------
+    debiased: list of float lists, batch version of debias_llm_responses
+    """
+    return subtract_biases(raw_llm_resps, estimate_biases(embeddings, beta, fa))
+
+
+def load_debias_model(
+    model_path: str = DEFAULT_MODEL_PATH,
+    variance_threshold: float = 0.90,
+    penalty_weight: float = 15.0,
+    lr: float = 1e-3,
+    epochs: int = 500,
+    solver: str = "adam",
+    pca_solver: str = "full",
+    reference_bank: str = None
+):
+    """
+    model_path: DebiasModel artifact (see debias_model.py); None always refits
+    variance_threshold, penalty_weight, lr, epochs, solver, pca_solver: fit parameters
+        the model must match (refits reuse the cached PCA/FA fits of the pickle)
+    reference_bank: train on this reference bank directory (see reference_bank.py)
+                    instead of the pickle
+
+    Returns
+    -------
+    model: DebiasModel, loaded from model_path when it was fit on the current pickle
+           with the same parameters, else fit in memory (FA loadings, mean, noise
+           variance and β on the average bias δ = llm_avg − human_avg)
+    df: the training DataFrame if the pickle had to be read, else None
+    """
+    fit_params = dict(variance_threshold=variance_threshold, penalty_weight=penalty_weight, lr=lr, epochs=epochs,
+                      solver=solver, pca_solver=pca_solver)
+    model = DebiasModel.load(model_path) if model_path and os.path.exists(model_path) else None
+    if reference_bank:
+        fingerprint = ReferenceBank.read_info(reference_bank)["fingerprint"]
+        if model is None or not model.matches(fingerprint=fingerprint, **fit_params):
+            model = DebiasModel.fit_bank(reference_bank, **fit_params)
+        return model, None
+    if model is not None and model.matches(DEFAULT_PICKLE_PATH, **fit_params):
+        return model, None
+    if not os.path.exists(DEFAULT_PICKLE_PATH):
+        raise FileNotFoundError(f"Cannot find embeddings pickle at {DEFAULT_PICKLE_PATH}")
+    df = pd.read_pickle(DEFAULT_PICKLE_PATH)
+    return DebiasModel.fit(DEFAULT_PICKLE_PATH, df=df, **fit_params), df
+
+
+def load_knn_estimator(reference_bank=None, **kwargs):
+    """
+    reference_bank: reference bank directory (see reference_bank.py); None uses the pickle
+    kwargs: passed to KNNBiasEstimator (k, temperature, index, ...)
+
+    Returns
+    -------
+    estimator: KNNBiasEstimator over the reference embeddings
+    df: the training DataFrame if the pickle was read, else None
+    """
+    if reference_bank:
+        return KNNBiasEstimator.from_bank(reference_bank, **kwargs), None
+    if not os.path.exists(DEFAULT_PICKLE_PATH):
+        raise FileNotFoundError(f"Cannot find embeddings pickle at {DEFAULT_PICKLE_PATH}")
+    df = pd.read_pickle(DEFAULT_PICKLE_PATH)
+    return KNNBiasEstimator.from_dataframe(df, **kwargs), df
+
+
+def warm_embedding_cache(cache, embed_model, training_df=None):
+    """
+    cache: EmbeddingCache
+    embed_model: str, embedding model the cache is used with
+    training_df: already-loaded training pickle, if any
+
+    Seeds the cache with the pickle's embeddings when they come from embed_model and
+    the pickle is already loaded or the cache is still empty.
+    """
+    if embed_model != PICKLE_EMBED_MODEL:
+        return
+    if training_df is None:
+        if cache.stats()["entries"] or not os.path.exists(DEFAULT_PICKLE_PATH):
+            return
+        training_df = pd.read_pickle(DEFAULT_PICKLE_PATH)
+    cache.warm_start(training_df, model=embed_model)
+
+
+class Debiaser:
+    """
+    In-memory debiasing with a loaded DebiasModel and an open embedding cache,
+    both kept for the lifetime of the object, so a call costs only the
+    embedding lookup of its questions and one matmul for all of them.
+
+    model: fitted DebiasModel or KNNBiasEstimator (default: load_debias_model())
+    embed_model: OpenAI embedding model matching the model's training embeddings
+    embedding_cache: EmbeddingCache; True (default) opens debias/.embedding_cache and
+                     warm-starts it from the pickle when empty; False/None disables caching
+    limiter: optional AdaptiveConcurrencyLimiter for the embedding requests
+    training_df: already-loaded training pickle, used for the warm start
+    """
+
+    def __init__(self, model=None, embed_model=PICKLE_EMBED_MODEL, embedding_cache=True, limiter=None,
+                 training_df=None):
+        if model is None:
+            model, training_df = load_debias_model()
+        self.model = model
+        self.embed_model = embed_model
+        self.limiter = limiter
+        self._owns_cache = embedding_cache is True
+        self.embedding_cache = EmbeddingCache() if self._owns_cache else (embedding_cache or None)
+        if self.embedding_cache is not None:
+            warm_embedding_cache(self.embedding_cache, embed_model, training_df)
+
+    def estimate_bias(self, questions):
+        """
+        questions: list of question texts
+
+        Returns
+        -------
+        deltas: ndarray of shape (len(questions),), the bias estimate δ̂ per question
+        """
+        questions = list(questions)
+        if not questions:
+            return np.empty(0)
+        embeddings = get_embeddings(questions, model=self.embed_model, limiter=self.limiter,
+                                    cache=self.embedding_cache)
+        return self.model.estimate_bias(np.vstack(embeddings))
+
+    def debias(self, questions, responses):
+        """
+        questions: list of question texts
+        responses: list of LLM response lists, one per question
+
+        Returns
+        -------
+        items: [{"Question", "llm_resp", "debiased_llm_resp"}, ...], one per question,
+               each response minus its question's single bias estimate
+        """
+        debiased = subtract_biases(responses, self.estimate_bias(questions))
+        return [
+            {"Question": question, "llm_resp": list(raw_llm), "debiased_llm_resp": debiased_llm}
+            for question, raw_llm, debiased_llm in zip(questions, responses, debiased)
+        ]
+
+    def close(self):
+        if self._owns_cache:
+            self.embedding_cache.close()
+
+
+_debiaser = None
+_debiaser_lock = threading.Lock()
+
+
+def get_debiaser():
+    """
+    Returns
+    -------
+    debiaser: the process-wide Debiaser, created on first use with the default
+              model artifact and embedding cache
+    """
+    global _debiaser
+    with _debiaser_lock:
+        if _debiaser is None:
+            _debiaser = Debiaser()
+        return _debiaser
+
+
+def debias(questions, responses):
+    """
+    questions: list of question texts
+    responses: list of LLM response lists, one per question
+
+    Returns
+    -------
+    items: see Debiaser.debias; uses the process-wide Debiaser (no files, no refit)
+    """
+    return get_debiaser().debias(questions, responses)
+
+
 def run_debias_pipeline(
     input_json: str,
     output_json: str,
@@ -138,60 +595,83 @@ def run_debias_pipeline(
     penalty_weight: float = 15.0,
     lr: float = 1e-3,
     epochs: int = 500,
-    embed_model: str = "text-embedding-3-small"
+    solver: str = "adam",
+    pca_solver: str = "full",
+    reference_bank: str = None,
+    embed_model: str = "text-embedding-3-small",
+    limiter: AdaptiveConcurrencyLimiter = None,
+    embedding_cache: Union[EmbeddingCache, None, bool] = True,
+    model_path: str = DEFAULT_MODEL_PATH,
+    estimator: str = "factor",
+    k_neighbours: int = 10
 ):
     """
-    input_json: path to the JSON file containing new questions
-    output_json: path where the debiased JSON will be written
+    input_json: path to the JSON file containing new questions, or a ResponseMatrix
+                saved as .npz/.arrow (question texts taken from the matrix)
+    output_json: path where the debiased JSON will be written; a .npz/.arrow path
+                 writes the debiased ResponseMatrix instead
     variance_threshold: PCA cumulative variance cutoff α (default 0.90)
     penalty_weight: directional penalty λ (default 15.0)
-    lr: learning rate for β optimization (default 1e-3)
-    epochs: number of training epochs (default 500)
+    lr: learning rate for β optimization (default 1e-3, adam solver only)
+    epochs: number of training epochs (default 500, adam solver only)
+    solver: "adam" (torch loop, default) or "lbfgs" (NumPy/SciPy solver of the hinge surrogate)
+    pca_solver: "full" (default) or "randomized" PCA for choosing k
+    reference_bank: optional reference bank directory to train on instead of the pickle
     embed_model: OpenAI embedding model to use (default "text-embedding-3-small")
+    limiter: optional AdaptiveConcurrencyLimiter for the embedding requests
+    embedding_cache: EmbeddingCache to reuse question embeddings across runs;
+                     True (default) uses the cache in debias/.embedding_cache,
+                     warm-started from the pickle; False/None disables caching
+    model_path: DebiasModel artifact (see debias_model.py) used instead of refitting
+                when it was fit on the current pickle with the same α, λ, lr, epochs and solver;
+                None always refits
+    estimator: "factor" (FA/β model, default) or "knn" (blend of the observed biases
+               of the k_neighbours most similar reference questions, see knn_bias.py)
+    k_neighbours: neighbours blended by the knn estimator
     """
 
-    # 1) Load the fixed pre‐existing pickle
-    # df = pd.read_pickle("survey_with_embeddings.pkl")
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    pickle_path = os.path.join(base_dir, "survey_with_embeddings.pkl")
-    if not os.path.exists(pickle_path):
-        raise FileNotFoundError(f"Cannot find embeddings pickle at {pickle_path}")
-    df = pd.read_pickle(pickle_path)
-
-    # 2) Stack embeddings and responses
-    embeddings = np.vstack(df["Embedding"].tolist())
-    human_avg   = np.array(df["Average_Human_Response"], dtype=float)
-    llm_avg     = np.array(df["Average_LLM_Response"], dtype=float)
-
-    # 3) Determine k and fit FA
-    k, _ = choose_components(embeddings, variance_threshold)
-    F, fa = fit_factor_analysis(embeddings, k)
-
-    # 4) Fit beta on the average bias δ = llm_avg − human_avg
-    delta = llm_avg - human_avg
-    beta  = fit_beta_with_penalty(
-        F, delta,
-        penalty_weight=penalty_weight,
-        lr=lr,
-        epochs=epochs
-    )
-
-    # 5) Read new questions JSON
-    with open(input_json, "r") as f:
-        data = json.load(f)
-    if isinstance(data, dict):
-        data = [data]
-
-    # 6) Debias each question
-    for item in data:
-        q       = item["Question"]
-        raw_llm = item["llm_resp"]
-        emb     = get_embedding(q, model=embed_model)
-        # returns a single scalar δ̂ and subtracts from every response
-        item["debiased_llm_resp"] = debias_llm_responses(
-            emb, beta, fa, raw_llm
+    # 1-4) Load the fitted DebiasModel artifact (FA loadings, mean, noise variance, β),
+    # refitting in memory only if it is missing, stale, or fit with other parameters;
+    # or index the reference embeddings for the knn estimator
+    if estimator == "knn":
+        model, df = load_knn_estimator(reference_bank, k=k_neighbours)
+    else:
+        model, df = load_debias_model(
+            model_path,
+            variance_threshold=variance_threshold,
+            penalty_weight=penalty_weight,
+            lr=lr,
+            epochs=epochs,
+            solver=solver,
+            pca_solver=pca_solver,
+            reference_bank=reference_bank
         )
 
+    # 5) Read new questions: a JSON list of items or a saved ResponseMatrix
+    matrix = None
+    if input_json.lower().endswith(MATRIX_SUFFIXES):
+        matrix = ResponseMatrix.load(input_json)
+        data = matrix.to_debias_items()
+    else:
+        with open(input_json, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [data]
+
+    # 6) Embed all uncached questions concurrently, then debias each question
+    debiaser = Debiaser(model, embed_model, embedding_cache, limiter, training_df=df)
+    try:
+        if matrix is not None and output_json.lower().endswith(MATRIX_SUFFIXES):
+            # one bias estimate per question, subtracted from its whole answer column
+            deltas = debiaser.estimate_bias([item["Question"] for item in data]).astype(np.float32)
+            matrix.with_answers(matrix.float_answers() - deltas).save(output_json)
+            return
+        debiased = debiaser.debias([item["Question"] for item in data], [item["llm_resp"] for item in data])
+    finally:
+        debiaser.close()
+    for item, debiased_item in zip(data, debiased):
+        item["debiased_llm_resp"] = debiased_item["debiased_llm_resp"]
+
     # 7) Write back out
     result = data[0] if len(data)==1 else data
     with open(output_json, "w") as f:
@@ -221,16 +701,40 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--lr", type=float, default=1e-3,
-        help="Learning rate for β fitting"
+        help="Learning rate for β fitting (adam solver only)"
     )
     parser.add_argument(
         "--epochs", type=int, default=500,
-        help="Number of training epochs"
+        help="Number of training epochs (adam solver only)"
+    )
+    parser.add_argument(
+        "--solver", choices=["adam", "lbfgs"], default="adam",
+        help="β solver: the torch Adam loop (default) or L-BFGS-B on the hinge surrogate"
+    )
+    parser.add_argument(
+        "--pca_solver", choices=["full", "randomized"], default="full",
+        help="PCA used to choose k: exact, or truncated for large reference banks"
+    )
+    parser.add_argument(
+        "--reference_bank", default=None,
+        help="Reference bank directory (reference_bank.py) to train on instead of the pickle"
+    )
+    parser.add_argument(
+        "--estimator", choices=["factor", "knn"], default="factor",
+        help="Bias estimator: FA/β factor model or nearest-neighbour lookup"
+    )
+    parser.add_argument(
+        "--k_neighbours", type=int, default=10,
+        help="Neighbours blended by the knn estimator"
     )
     parser.add_argument(
         "--embed_model", type=str, default="text-embedding-3-small",
         help="OpenAI embedding model"
     )
+    parser.add_argument(
+        "--model", default=DEFAULT_MODEL_PATH,
+        help="Fitted DebiasModel artifact (refit in memory if missing or stale)"
+    )
     args = parser.parse_args()
 
     # set your API key in the environment beforehand
@@ -246,9 +750,16 @@ if __name__ == "__main__":
         penalty_weight=args.lambda_,
         lr=args.lr,
         epochs=args.epochs,
-        embed_model=args.embed_model
+        solver=args.solver,
+        pca_solver=args.pca_solver,
+        reference_bank=args.reference_bank,
+        embed_model=args.embed_model,
+        model_path=args.model,
+        estimator=args.estimator,
+        k_neighbours=args.k_neighbours
     )
 
 # User Example
 # export OPENAI_API_KEY="sk-YOUR_REAL_KEY_HERE"
+# python debias_model.py          # fit once, writes debias_model.npz
 # python debias.py --input_json test_new_questions.json --output_json test_debiased_output.json
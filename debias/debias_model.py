@@ -0,0 +1,276 @@
+"""
+Fit-once, reuse-many artifact for the factor-model debiaser.
+
+A DebiasModel stores what inference needs from a fitted pipeline: the
+FactorAnalysis loadings, mean and noise variance, the bias coefficients β
+and the fit metadata. It is saved as a single .npz file (no pickle), so
+loading takes milliseconds. Inference is then a pure NumPy matmul:
+
+  F     = (x - mean) · (W/ψ)ᵀ · (I + (W/ψ)·Wᵀ)⁻¹     (FactorAnalysis.transform)
+  δ̂(x) = F · β = x · w + b
+
+with w and b folded together once when the model is built.
+
+Fit the default artifact with:
+  python debias_model.py --output debias_model.npz
+or, on a reference bank built by reference_bank.py:
+  python debias_model.py --bank reference_bank --output debias_model.npz
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+try:
+    from .reference_bank import ReferenceBank, DEFAULT_BANK_DIR
+except ImportError:
+    from reference_bank import ReferenceBank, DEFAULT_BANK_DIR
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PICKLE_PATH = os.path.join(BASE_DIR, "survey_with_embeddings.pkl")
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "debias_model.npz")
+
+# Metadata that must match for a saved model to stand in for a fresh fit.
+FIT_PARAMS = ("variance_threshold", "penalty_weight", "lr", "epochs", "solver", "pca_solver")
+
+# β solvers: the original torch Adam loop, or the L-BFGS-B dual of its hinge surrogate (NumPy/SciPy).
+SOLVERS = ("adam", "lbfgs")
+
+
+def file_sha256(path):
+    """
+    path: str
+    returns: str, sha256 hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DebiasModel:
+    """
+    components: ndarray (k, n_features), FactorAnalysis loadings W
+    mean: ndarray (n_features,), FactorAnalysis mean
+    noise_variance: ndarray (n_features,), FactorAnalysis noise variance ψ
+    beta: ndarray (k,), bias coefficients on the factor scores
+    metadata: dict, fit parameters and provenance (JSON-serializable)
+    """
+
+    def __init__(self, components, mean, noise_variance, beta, metadata=None):
+        self.components = np.asarray(components, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.noise_variance = np.asarray(noise_variance, dtype=np.float64)
+        self.beta = np.asarray(beta, dtype=np.float64)
+        self.metadata = dict(metadata or {})
+        # Fold FactorAnalysis.transform and β into one weight vector and offset.
+        k = self.components.shape[0]
+        w_psi = self.components / self.noise_variance
+        cov_z = np.linalg.inv(np.eye(k) + w_psi @ self.components.T)
+        self.projection = w_psi.T @ cov_z                  # (n_features, k)
+        self.bias_weights = self.projection @ self.beta    # (n_features,)
+        self.bias_offset = -float(self.mean @ self.bias_weights)
+
+    @property
+    def n_components(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def from_factor_analysis(cls, fa, beta, metadata=None):
+        """
+        fa: fitted sklearn FactorAnalysis
+        beta: array-like (k,)
+        metadata: optional dict
+        """
+        return cls(fa.components_, fa.mean_, fa.noise_variance_, beta, metadata)
+
+    @classmethod
+    def fit(cls, pickle_path=DEFAULT_PICKLE_PATH, variance_threshold=0.90, penalty_weight=15.0,
+            lr=1e-3, epochs=500, solver="adam", pca_solver="full", df=None, fit_cache=True):
+        """
+        pickle_path: training pickle with 'Embedding', 'Average_Human_Response',
+                     'Average_LLM_Response' columns
+        variance_threshold, penalty_weight, lr, epochs: as in run_debias_pipeline
+        solver: "adam" (fit_beta_with_penalty, default; the only one that uses lr
+                and epochs) or "lbfgs" (fit_beta_lbfgs, opt-in until it matches adam
+                within benchmarks/bench_beta_solver.py's tolerance)
+        pca_solver: "full" or "randomized" PCA for choosing k (see choose_components)
+        df: optional already-loaded training DataFrame (pickle_path is still hashed)
+        fit_cache: reuse/store the PCA and FA fits in debias/.fit_cache, keyed on the
+                   pickle's sha256 (see fit_factor_model)
+        returns: DebiasModel
+        """
+        import pandas as pd
+
+        if df is None:
+            df = pd.read_pickle(pickle_path)
+        embeddings = np.vstack(df["Embedding"].tolist())
+        delta = np.array(df["Average_LLM_Response"], dtype=float) - np.array(df["Average_Human_Response"], dtype=float)
+        fingerprint = file_sha256(pickle_path) if os.path.exists(pickle_path) else None
+        return cls._fit(embeddings, delta, fingerprint, variance_threshold, penalty_weight, lr, epochs,
+                        solver, pca_solver, fit_cache)
+
+    @classmethod
+    def fit_bank(cls, bank_dir=DEFAULT_BANK_DIR, variance_threshold=0.90, penalty_weight=15.0,
+                 lr=1e-3, epochs=500, solver="adam", pca_solver="full", fit_cache=True):
+        """
+        Same as fit, on a reference bank built by reference_bank.py: the embeddings
+        are memory-mapped float32 rows instead of a pickled object column.
+
+        bank_dir: reference bank directory
+        returns: DebiasModel, with the bank's fingerprint as training_sha256
+        """
+        bank = ReferenceBank.load(bank_dir)
+        model = cls._fit(bank.embeddings, bank.delta, bank.fingerprint, variance_threshold, penalty_weight,
+                         lr, epochs, solver, pca_solver, fit_cache)
+        model.metadata.update({"reference_bank": os.path.abspath(bank_dir), "embed_model": bank.embed_model})
+        return model
+
+    @classmethod
+    def _fit(cls, embeddings, delta, fingerprint, variance_threshold, penalty_weight, lr, epochs,
+             solver, pca_solver, fit_cache):
+        try:
+            from .debias import fit_factor_model, fit_beta_with_penalty, fit_beta_lbfgs
+        except ImportError:
+            from debias import fit_factor_model, fit_beta_with_penalty, fit_beta_lbfgs
+
+        if solver not in SOLVERS:
+            raise ValueError(f"solver must be one of {SOLVERS}, got {solver!r}")
+
+        k, F, fa = fit_factor_model(embeddings, variance_threshold, svd_solver=pca_solver,
+                                    fingerprint=fingerprint if fit_cache else None)
+        if solver == "adam":
+            beta = fit_beta_with_penalty(F, delta, penalty_weight=penalty_weight, lr=lr, epochs=epochs)
+        else:
+            beta = fit_beta_lbfgs(F, delta, penalty_weight=penalty_weight)
+        metadata = {
+            "variance_threshold": variance_threshold,
+            "penalty_weight": penalty_weight,
+            "lr": lr,
+            "epochs": epochs,
+            "solver": solver,
+            "pca_solver": pca_solver,
+            "n_components": int(k),
+            "n_training_questions": int(len(delta)),
+            "training_sha256": fingerprint,
+            "fitted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        return cls.from_factor_analysis(fa, beta, metadata)
+
+    def matches(self, pickle_path=DEFAULT_PICKLE_PATH, fingerprint=None, **fit_params):
+        """
+        pickle_path: training pickle the model should have been fit on
+        fingerprint: training data fingerprint to compare instead (e.g. a reference bank's)
+        fit_params: values for FIT_PARAMS to compare with the stored metadata
+        returns: bool, True if the model was fit on this data with these parameters
+        """
+        if fingerprint is None and os.path.exists(pickle_path):
+            fingerprint = file_sha256(pickle_path)
+        if fingerprint is not None and self.metadata.get("training_sha256") != fingerprint:
+            return False
+        return all(self.metadata.get(name) == value for name, value in fit_params.items() if name in FIT_PARAMS)
+
+    def factor_scores(self, embeddings):
+        """
+        embeddings: array-like (n_features,) or (n, n_features)
+        returns: ndarray (k,) or (n, k), same as FactorAnalysis.transform
+        """
+        X = np.asarray(embeddings, dtype=np.float64)
+        return (X - self.mean) @ self.projection
+
+    def estimate_bias(self, embeddings):
+        """
+        embeddings: array-like (n_features,) or (n, n_features)
+        returns: float for one embedding, else ndarray (n,) of bias estimates δ̂
+        """
+        X = np.asarray(embeddings, dtype=np.float64)
+        delta = X @ self.bias_weights + self.bias_offset
+        return float(delta) if X.ndim == 1 else delta
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        """
+        path: str, .npz file to write
+        """
+        np.savez(
+            path,
+            components=self.components,
+            mean=self.mean,
+            noise_variance=self.noise_variance,
+            beta=self.beta,
+            metadata=np.array(json.dumps(self.metadata)),
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """
+        path: str, .npz file written by save
+        returns: DebiasModel
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["components"], data["mean"], data["noise_variance"], data["beta"],
+                       json.loads(str(data["metadata"])))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Fit the factor-model debiaser once and save it as a reusable artifact"
+    )
+    parser.add_argument(
+        "--pickle", default=DEFAULT_PICKLE_PATH,
+        help="Training pickle with embeddings and average human/LLM responses"
+    )
+    parser.add_argument(
+        "--bank", default=None,
+        help="Fit on a reference bank directory (reference_bank.py) instead of the pickle"
+    )
+    parser.add_argument(
+        "--output", "-o", default=DEFAULT_MODEL_PATH,
+        help="Where to write the model (.npz)"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.90,
+        help="PCA variance threshold α"
+    )
+    parser.add_argument(
+        "--lambda_", type=float, default=15.0,
+        help="Directional penalty weight λ"
+    )
+    parser.add_argument(
+        "--lr", type=float, default=1e-3,
+        help="Learning rate for β fitting (adam solver only)"
+    )
+    parser.add_argument(
+        "--epochs", type=int, default=500,
+        help="Number of training epochs (adam solver only)"
+    )
+    parser.add_argument(
+        "--solver", choices=SOLVERS, default="adam",
+        help="β solver: the torch Adam loop (default) or L-BFGS-B on the hinge surrogate"
+    )
+    parser.add_argument(
+        "--pca_solver", choices=["full", "randomized"], default="full",
+        help="PCA used to choose k: exact, or truncated for large reference banks"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fit_params = dict(
+        variance_threshold=args.alpha,
+        penalty_weight=args.lambda_,
+        lr=args.lr,
+        epochs=args.epochs,
+        solver=args.solver,
+        pca_solver=args.pca_solver
+    )
+    if args.bank:
+        model = DebiasModel.fit_bank(args.bank, **fit_params)
+    else:
+        model = DebiasModel.fit(pickle_path=args.pickle, **fit_params)
+    model.save(args.output)
+    print(f"Fitted {model.n_components}-factor model in {time.perf_counter() - start:.2f}s -> {args.output}")
+    print(json.dumps(model.metadata, indent=2))
@@ -0,0 +1,219 @@
+"""
+Persistent embedding store for the debias pipeline.
+
+Embeddings are keyed on (model, hash of the normalized question text) and
+kept in one memory-mapped float32 matrix per model, with a SQLite index
+mapping each key to its row and last access time. When a model's matrix
+reaches `max_entries` rows, the least recently used rows are overwritten.
+
+Layout of a cache directory:
+  index.sqlite                 key -> (model, row, last access)
+  <model>-<dim>.f32            float32 matrix, one embedding per row
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache")
+
+# Model that produced the embeddings in survey_with_embeddings.pkl.
+PICKLE_EMBED_MODEL = "text-embedding-3-small"
+
+
+def normalize_text(text):
+    """
+    text: str
+    returns: str, NFC-normalized with runs of whitespace collapsed, so trivially
+             different copies of a question share one cache entry
+    """
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def embedding_key(model, text):
+    """
+    model: str, embedding model name
+    text: str
+    returns: str, sha256 hex key of (model, normalized text)
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    directory: folder holding the index and the per-model matrices (created if missing)
+    max_entries: rows kept per model before least recently used rows are reused
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=100_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._matrices = {}
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " row INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_model_access ON embeddings(model, last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS matrices ("
+            " model TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " rows INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _matrix_path(self, model, dim):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.directory, f"{safe}-{dim}.f32")
+
+    def _matrix(self, model, dim=None, rows=None):
+        """Memory-mapped matrix for `model`, grown to hold at least `rows` rows."""
+        meta = self._conn.execute("SELECT dim, rows FROM matrices WHERE model = ?", (model,)).fetchone()
+        if meta is None:
+            if dim is None:
+                return None
+            self._conn.execute("INSERT INTO matrices (model, dim, rows) VALUES (?, ?, 0)", (model, dim))
+            meta = (dim, 0)
+        dim = meta[0]
+        path = self._matrix_path(model, dim)
+        capacity = os.path.getsize(path) // (4 * dim) if os.path.exists(path) else 0
+        if rows is not None and rows > capacity:
+            # Grow geometrically so repeated inserts do not remap the file every time.
+            capacity = min(self.max_entries, max(rows, 2 * capacity, 1024))
+            with open(path, "ab") as f:
+                f.truncate(capacity * dim * 4)
+            self._matrices.pop(model, None)
+        if capacity == 0:
+            return None
+        cached = self._matrices.get(model)
+        if cached is None or cached.shape[0] != capacity:
+            cached = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            self._matrices[model] = cached
+        return cached
+
+    def _rows(self, keys):
+        """{key: row} for the cached keys among `keys` (queried in chunks under SQLite's variable limit)."""
+        rows = {}
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            rows.update(self._conn.execute(
+                f"SELECT key, row FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return rows
+
+    def _touch(self, keys):
+        now = time.time()
+        self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in keys])
+
+    def get_many(self, texts, model):
+        """
+        texts: list[str]
+        model: str, embedding model name
+        returns: list of float32 vectors (None where not cached), in the order of `texts`
+        """
+        keys = [embedding_key(model, text) for text in texts]
+        with self._lock:
+            rows = self._rows(list(dict.fromkeys(keys)))
+            matrix = self._matrix(model) if rows else None
+            if rows:
+                self._touch(rows)
+                self._conn.commit()
+            results = [np.array(matrix[rows[key]]) if key in rows else None for key in keys]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts, vectors, model):
+        """
+        texts: list[str]
+        vectors: list of embedding vectors (or a 2-D array), aligned with `texts`
+        model: str, embedding model name
+        """
+        if not len(texts):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        entries = dict(zip((embedding_key(model, text) for text in texts), vectors))
+        dim = vectors.shape[1]
+        with self._lock:
+            meta = self._conn.execute("SELECT dim, rows FROM matrices WHERE model = ?", (model,)).fetchone()
+            if meta is not None and meta[0] != dim:
+                raise ValueError(f"Cached {model} embeddings have dim {meta[0]}, got {dim}")
+            allocated = meta[1] if meta else 0
+            existing = self._rows(list(entries))
+            # Mark re-written entries as fresh so they are never chosen for eviction below.
+            self._touch(existing)
+            assignments = list(existing.items())
+            new_keys = [key for key in entries if key not in existing]
+            n_fresh = min(len(new_keys), max(0, self.max_entries - allocated))
+            for key in new_keys[:n_fresh]:
+                assignments.append((key, allocated))
+                allocated += 1
+            overflow = new_keys[n_fresh:]
+            if overflow:
+                # Full: reuse the rows of the least recently used entries.
+                victims = self._conn.execute(
+                    "SELECT key, row FROM embeddings WHERE model = ? ORDER BY last_access LIMIT ?",
+                    (model, len(overflow))
+                ).fetchall()
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in victims])
+                self.evictions += len(victims)
+                assignments.extend((key, row) for key, (_, row) in zip(overflow, victims))
+            matrix = self._matrix(model, dim, rows=allocated)
+            for key, row in assignments:
+                matrix[row] = entries[key]
+            matrix.flush()
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, row, last_access) VALUES (?, ?, ?, ?)",
+                [(key, model, row, now) for key, row in assignments]
+            )
+            self._conn.execute("UPDATE matrices SET rows = ? WHERE model = ?", (allocated, model))
+            self._conn.commit()
+
+    def warm_start(self, df, model=PICKLE_EMBED_MODEL, text_column="Question", embedding_column="Embedding"):
+        """
+        df: DataFrame with question texts and their embeddings, e.g. survey_with_embeddings.pkl
+        model: str, model that produced the embeddings
+        returns: int, number of texts that were not cached yet
+        """
+        texts = df[text_column].tolist()
+        cached = self.get_many(texts, model)
+        self.hits -= sum(vector is not None for vector in cached)
+        self.misses -= sum(vector is None for vector in cached)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            embeddings = df[embedding_column].tolist()
+            self.put_many([texts[i] for i in missing], np.vstack([embeddings[i] for i in missing]), model)
+        return len(missing)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            for matrix in self._matrices.values():
+                matrix.flush()
+            self._matrices.clear()
+            self._conn.close()
@@ -0,0 +1,217 @@
+"""
+Nearest-neighbour bias estimator for the debias stage.
+
+Instead of the global factor model, the bias of a new question is a blend of
+the observed biases δ = Average_LLM_Response − Average_Human_Response of the
+most similar reference questions (cosine similarity of their embeddings):
+
+  δ̂(x) = Σ_j w_j δ_j over the k nearest neighbours, w = softmax(sim / temperature)
+
+Two vector indexes over the (normalized) reference embeddings:
+  FlatIndex   exact search, one BLAS matmul per query batch (small banks)
+  IVFIndex    inverted-file index: k-means coarse quantizer, only the n_probe
+              closest lists are scanned (large banks, approximate)
+
+KNNBiasEstimator.estimate_bias has the same signature as
+DebiasModel.estimate_bias, so a Debiaser can use either.
+"""
+import numpy as np
+
+try:
+    from .reference_bank import ReferenceBank, DEFAULT_BANK_DIR
+except ImportError:
+    from reference_bank import ReferenceBank, DEFAULT_BANK_DIR
+
+# Banks with at least this many rows use the IVF index when index="auto".
+IVF_MIN_ROWS = 50_000
+
+
+def normalize_rows(X):
+    """
+    X: array-like (n, dim)
+    returns: float32 ndarray (n, dim) with unit-norm rows (zero rows are left as is)
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores, k):
+    """Column indices of the k largest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def spherical_kmeans(X, n_clusters, n_iter=10, seed=0):
+    """
+    X: float32 array (n, dim) with unit-norm rows
+    n_clusters: int
+    n_iter: Lloyd iterations (assignment is one matmul against the centroids)
+    seed: int
+    returns: float32 ndarray (n_clusters, dim), unit-norm centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.concatenate([
+            (X[start:start + 8192] @ centroids.T).argmax(axis=1) for start in range(0, len(X), 8192)
+        ])
+        counts = np.bincount(assignment, minlength=n_clusters)
+        order = np.argsort(assignment, kind="stable")
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(X[order], np.cumsum(counts)[filled] - counts[filled])
+        empty = ~filled
+        # re-seed empty clusters with random points
+        sums[empty] = X[rng.choice(len(X), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class FlatIndex:
+    """
+    Exact maximum inner product search over unit-norm vectors.
+
+    vectors: array-like (n, dim); normalized on construction
+    batch_size: queries scored per matmul, bounding the (batch, n) score matrix
+    """
+
+    def __init__(self, vectors, batch_size=1024):
+        self.vectors = normalize_rows(vectors)
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k):
+        """
+        queries: array-like (m, dim)
+        k: int, neighbours per query
+        returns: (similarities (m, k), indices (m, k)), best first
+        """
+        queries = normalize_rows(queries)
+        sims, ids = [], []
+        for start in range(0, len(queries), self.batch_size):
+            scores = queries[start:start + self.batch_size] @ self.vectors.T
+            top = _top_k(scores, k)
+            ids.append(top)
+            sims.append(np.take_along_axis(scores, top, axis=1))
+        return np.vstack(sims), np.vstack(ids)
+
+
+class IVFIndex:
+    """
+    Approximate search: vectors are assigned to the nearest of n_lists
+    spherical k-means centroids, and a query scans only the n_probe lists whose
+    centroids it is closest to.
+
+    vectors: array-like (n, dim); normalized on construction
+    n_lists: number of inverted lists (default ≈ 4·√n)
+    n_probe: lists scanned per query (recall/latency trade-off)
+    train_size: vectors sampled to fit the centroids
+    seed: k-means seed
+    """
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, train_size=50_000, seed=0):
+        self.vectors = normalize_rows(vectors)
+        n = len(self.vectors)
+        self.n_lists = int(n_lists or max(1, min(n, round(4 * np.sqrt(n)))))
+        self.n_probe = min(n_probe, self.n_lists)
+        rng = np.random.default_rng(seed)
+        sample = self.vectors if n <= train_size else self.vectors[rng.choice(n, train_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, self.n_lists, seed=seed)
+        assignment = np.concatenate([
+            (self.vectors[start:start + 8192] @ self.centroids.T).argmax(axis=1)
+            for start in range(0, n, 8192)
+        ])
+        # CSR layout: the rows of list c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignment, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))])
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k):
+        """
+        queries: array-like (m, dim)
+        k: int, neighbours per query
+        returns: (similarities (m, k), indices (m, k)), best first; padded with
+                 -inf / -1 when the probed lists hold fewer than k vectors
+        """
+        queries = normalize_rows(queries)
+        probes = _top_k(queries @ self.centroids.T, self.n_probe)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            scores = self.vectors[candidates] @ query
+            top = _top_k(scores[None, :], k)[0]
+            sims[i, :len(top)] = scores[top]
+            ids[i, :len(top)] = candidates[top]
+        return sims, ids
+
+
+class KNNBiasEstimator:
+    """
+    embeddings: array-like (n, dim), reference question embeddings
+    deltas: array-like (n,), observed bias δ of each reference question
+    k: neighbours blended per query
+    temperature: softmax temperature on cosine similarity (smaller → closer to 1-NN)
+    index: "flat", "ivf", or "auto" (ivf from IVF_MIN_ROWS rows)
+    index_kwargs: passed to IVFIndex (n_lists, n_probe, ...)
+    """
+
+    def __init__(self, embeddings, deltas, k=10, temperature=0.05, index="auto", **index_kwargs):
+        self.deltas = np.asarray(deltas, dtype=float)
+        if len(self.deltas) != len(embeddings):
+            raise ValueError("embeddings and deltas must have the same length")
+        if index == "auto":
+            index = "ivf" if len(self.deltas) >= IVF_MIN_ROWS else "flat"
+        if index not in ("flat", "ivf"):
+            raise ValueError(f"index must be 'flat', 'ivf' or 'auto', got {index!r}")
+        self.index = IVFIndex(embeddings, **index_kwargs) if index == "ivf" else FlatIndex(embeddings)
+        self.k = k
+        self.temperature = temperature
+        self.metadata = {"estimator": "knn", "k": k, "temperature": temperature, "index": index,
+                         "n_reference_questions": len(self.deltas)}
+
+    @classmethod
+    def from_bank(cls, bank_dir=DEFAULT_BANK_DIR, **kwargs):
+        """
+        bank_dir: reference bank directory (see reference_bank.py)
+        kwargs: as for KNNBiasEstimator
+        """
+        bank = ReferenceBank.load(bank_dir)
+        return cls(bank.embeddings, bank.delta, **kwargs)
+
+    @classmethod
+    def from_dataframe(cls, df, **kwargs):
+        """
+        df: training DataFrame with 'Embedding', 'Average_Human_Response' and
+            'Average_LLM_Response' columns (e.g. survey_with_embeddings.pkl)
+        kwargs: as for KNNBiasEstimator
+        """
+        deltas = np.array(df["Average_LLM_Response"], dtype=float) - np.array(df["Average_Human_Response"], dtype=float)
+        return cls(np.vstack(df["Embedding"].tolist()), deltas, **kwargs)
+
+    def neighbours(self, embeddings):
+        """
+        embeddings: array-like (n_features,) or (n, n_features)
+        returns: (similarities (n, k), reference row indices (n, k)), best first
+        """
+        X = np.asarray(embeddings, dtype=np.float32)
+        return self.index.search(X.reshape(-1, X.shape[-1]), self.k)
+
+    def estimate_bias(self, embeddings):
+        """
+        embeddings: array-like (n_features,) or (n, n_features)
+        returns: float for one embedding, else ndarray (n,) of bias estimates δ̂
+        """
+        sims, ids = self.neighbours(embeddings)
+        logits = np.where(ids >= 0, sims / self.temperature, -np.inf)
+        weights = np.exp(logits - logits.max(axis=1, keepdims=True))
+        weights /= weights.sum(axis=1, keepdims=True)
+        delta = (weights * self.deltas[np.maximum(ids, 0)]).sum(axis=1)
+        return float(delta[0]) if np.ndim(embeddings) == 1 else delta
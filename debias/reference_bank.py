@@ -0,0 +1,295 @@
+"""
+Reference bank: the debias training questions in a layout that scales past
+a pickled DataFrame.
+
+Layout of a bank directory:
+  embeddings.npy      float32 (n_questions, dim) matrix, memory-mapped on load
+  metadata.parquet    one row per question, aligned with the embedding rows:
+                      Key, Source, Variable_Name, Question,
+                      Average_Human_Response, Average_LLM_Response
+                      (schema metadata: embed model, dim, fingerprint)
+
+A row is identified by its source CSV name, Variable_Name and normalized
+question text, so re-ingesting a CSV updates its rows instead of duplicating
+them. Only question texts not already in the bank are embedded.
+
+Existing rows never move and new rows are appended, and ingest replaces
+metadata.parquet last. A crash between the two replacements therefore leaves
+the previous metadata next to a longer embeddings.npy, and load ignores the
+trailing rows the metadata does not reference.
+
+Build or extend a bank from any number of reference CSVs:
+  python reference_bank.py gss_with_llm_responses_*.csv --bank reference_bank
+"""
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .embedding_cache import EmbeddingCache, PICKLE_EMBED_MODEL, normalize_text
+except ImportError:
+    from embedding_cache import EmbeddingCache, PICKLE_EMBED_MODEL, normalize_text
+
+DEFAULT_BANK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_bank")
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.parquet"
+
+# Older reference CSVs use these column names.
+COLUMN_ALIASES = {
+    "Average_Human": "Average_Human_Response",
+    "Average_LLM_response": "Average_LLM_Response",
+}
+RESPONSE_COLUMNS = ("Average_Human_Response", "Average_LLM_Response")
+METADATA_COLUMNS = ("Key", "Source", "Variable_Name", "Question") + RESPONSE_COLUMNS
+
+# New rows are embedded and written in chunks of this many questions.
+INGEST_CHUNK = 8192
+
+
+def row_key(source, variable_name, question):
+    """
+    source: str, name of the reference CSV the row came from
+    variable_name: str
+    question: str
+    returns: str, sha256 hex key identifying the reference row
+    """
+    digest = hashlib.sha256()
+    for part in (os.path.basename(str(source)), str(variable_name), normalize_text(question)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def bank_fingerprint(metadata, embed_model):
+    """
+    metadata: DataFrame with the METADATA_COLUMNS, in embedding row order
+    embed_model: str
+    returns: str, sha256 hex digest of the rows, their responses and the embed model
+    """
+    digest = hashlib.sha256(embed_model.encode("utf-8"))
+    digest.update("\n".join(metadata["Key"]).encode("utf-8"))
+    for column in RESPONSE_COLUMNS:
+        digest.update(np.ascontiguousarray(metadata[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def read_reference_csvs(paths):
+    """
+    paths: list of reference CSV paths with Question and average human/LLM response columns
+    returns: DataFrame with the METADATA_COLUMNS; rows without both averages are dropped
+             and, within a source, the last copy of a row wins
+    """
+    frames = []
+    for path in paths:
+        frame = pd.read_csv(path).rename(columns=COLUMN_ALIASES)
+        missing = [column for column in ("Question",) + RESPONSE_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"{path} is missing columns {missing}")
+        if "Variable_Name" not in frame.columns:
+            frame["Variable_Name"] = ""
+        frame["Source"] = os.path.basename(path)
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(METADATA_COLUMNS))
+    df = df.dropna(subset=list(RESPONSE_COLUMNS))
+    df["Variable_Name"] = df["Variable_Name"].fillna("").astype(str)
+    df["Question"] = df["Question"].astype(str)
+    df["Key"] = [row_key(*row) for row in zip(df["Source"], df["Variable_Name"], df["Question"])]
+    df = df.drop_duplicates("Key", keep="last")
+    return df[list(METADATA_COLUMNS)].reset_index(drop=True)
+
+
+class ReferenceBank:
+    """
+    metadata: DataFrame with the METADATA_COLUMNS, row i describing embeddings[i]
+    embeddings: float32 array (n_questions, dim), usually a read-only memmap
+    embed_model: str, embedding model of every row
+    fingerprint: str, see bank_fingerprint
+    """
+
+    def __init__(self, metadata, embeddings, embed_model, fingerprint=None):
+        if len(metadata) != len(embeddings):
+            raise ValueError("Reference bank metadata and embeddings have different lengths")
+        self.metadata = metadata
+        self.embeddings = embeddings
+        self.embed_model = embed_model
+        self.fingerprint = fingerprint or bank_fingerprint(metadata, embed_model)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def delta(self):
+        """ndarray (n_questions,), the average bias δ = llm_avg − human_avg per question."""
+        return (self.metadata["Average_LLM_Response"].to_numpy(dtype=float)
+                - self.metadata["Average_Human_Response"].to_numpy(dtype=float))
+
+    @staticmethod
+    def exists(directory=DEFAULT_BANK_DIR):
+        return all(os.path.exists(os.path.join(directory, name)) for name in (EMBEDDINGS_FILE, METADATA_FILE))
+
+    @staticmethod
+    def read_info(directory=DEFAULT_BANK_DIR):
+        """
+        directory: bank directory
+        returns: dict with embed_model, dim and fingerprint, read from the Parquet
+                 schema without loading any rows
+        """
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(os.path.join(directory, METADATA_FILE))
+        return json.loads(schema.metadata[b"reference_bank"])
+
+    @classmethod
+    def load(cls, directory=DEFAULT_BANK_DIR, mmap=True):
+        """
+        directory: bank directory written by ingest
+        mmap: memory-map the embeddings instead of reading them into memory
+        returns: ReferenceBank
+        """
+        info = cls.read_info(directory)
+        metadata = pd.read_parquet(os.path.join(directory, METADATA_FILE))
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        if len(embeddings) > len(metadata):
+            # rows appended by an ingest that stopped before replacing the metadata
+            embeddings = embeddings[:len(metadata)]
+        return cls(metadata, embeddings, info["embed_model"], info["fingerprint"])
+
+    def save_metadata(self, directory):
+        tmp_path = os.path.join(directory, METADATA_FILE + ".tmp")
+        _write_metadata(tmp_path, self.metadata, self.embed_model, int(self.embeddings.shape[1]), self.fingerprint)
+        os.replace(tmp_path, os.path.join(directory, METADATA_FILE))
+
+
+def _write_metadata(path, metadata, embed_model, dim, fingerprint):
+    """Write the metadata Parquet file with the bank info in its schema metadata."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(metadata, preserve_index=False)
+    info = {"embed_model": embed_model, "dim": dim, "fingerprint": fingerprint}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b"reference_bank": json.dumps(info).encode("utf-8")})
+    pq.write_table(table, path)
+
+
+def ingest(csv_paths, directory=DEFAULT_BANK_DIR, embed_model=PICKLE_EMBED_MODEL, limiter=None,
+           embedding_cache=True):
+    """
+    Merge reference CSVs into the bank at `directory`, embedding only question
+    texts the bank does not hold yet.
+
+    csv_paths: list of reference CSV paths
+    directory: bank directory (created if missing)
+    embed_model: OpenAI embedding model; must match an existing bank's model
+    limiter: optional AdaptiveConcurrencyLimiter for the embedding requests
+    embedding_cache: EmbeddingCache; True (default) opens debias/.embedding_cache,
+                     warm-started from the training pickle when empty; False/None disables it
+    returns: (ReferenceBank, number of question texts new to the bank)
+    """
+    try:
+        from .debias import get_embeddings, warm_embedding_cache
+    except ImportError:
+        from debias import get_embeddings, warm_embedding_cache
+
+    incoming = read_reference_csvs(csv_paths)
+    os.makedirs(directory, exist_ok=True)
+    if ReferenceBank.exists(directory):
+        bank = ReferenceBank.load(directory)
+        if bank.embed_model != embed_model:
+            raise ValueError(f"Bank at {directory} holds {bank.embed_model} embeddings, not {embed_model}; "
+                             f"ingest into a new directory instead")
+        old_metadata, old_embeddings = bank.metadata, bank.embeddings
+        del bank
+    else:
+        old_metadata, old_embeddings = pd.DataFrame(columns=list(METADATA_COLUMNS)), None
+
+    # Existing rows keep their embedding row (responses are updated); new rows are appended.
+    positions = {key: i for i, key in enumerate(old_metadata["Key"])}
+    is_new = ~incoming["Key"].isin(positions)
+    metadata = old_metadata.copy()
+    updates = incoming[~is_new]
+    if len(updates):
+        rows = updates["Key"].map(positions).to_numpy()
+        for column in RESPONSE_COLUMNS:
+            metadata.loc[rows, column] = updates[column].to_numpy()
+    new_rows = incoming[is_new].reset_index(drop=True)
+    metadata = pd.concat([metadata, new_rows], ignore_index=True)
+    for column in RESPONSE_COLUMNS:
+        metadata[column] = metadata[column].astype(float)
+
+    # Question texts already embedded in the bank are copied; the rest go through get_embeddings.
+    known_texts = {normalize_text(text): i for i, text in enumerate(old_metadata["Question"])}
+    texts_to_embed = list(dict.fromkeys(
+        normalize_text(text) for text in new_rows["Question"] if normalize_text(text) not in known_texts
+    ))
+
+    close_cache = embedding_cache is True
+    cache = EmbeddingCache() if close_cache else (embedding_cache or None)
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    tmp_path = os.path.join(directory, "embeddings.tmp.npy")
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    metadata_tmp_path = metadata_path + ".tmp"
+    n_old = len(old_metadata)
+    out = None
+    try:
+        if cache is not None and texts_to_embed:
+            warm_embedding_cache(cache, embed_model)
+        new_vectors = {}
+        for start in range(0, len(texts_to_embed), INGEST_CHUNK):
+            chunk = texts_to_embed[start:start + INGEST_CHUNK]
+            vectors = get_embeddings(chunk, model=embed_model, limiter=limiter, cache=cache)
+            new_vectors.update(zip(chunk, np.asarray(vectors, dtype=np.float32)))
+
+        if old_embeddings is not None:
+            dim = old_embeddings.shape[1]
+        elif new_vectors:
+            dim = len(next(iter(new_vectors.values())))
+        else:
+            raise ValueError("No reference questions to ingest")
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(metadata), dim))
+        for start in range(0, n_old, INGEST_CHUNK):
+            stop = min(start + INGEST_CHUNK, n_old)
+            out[start:stop] = old_embeddings[start:stop]
+        for i, text in enumerate(new_rows["Question"], start=n_old):
+            text = normalize_text(text)
+            out[i] = new_vectors[text] if text in new_vectors else old_embeddings[known_texts[text]]
+        out.flush()
+    finally:
+        if close_cache:
+            cache.close()
+    del out, old_embeddings
+
+    # Both files are staged first; the metadata is replaced last (see the module docstring).
+    fingerprint = bank_fingerprint(metadata, embed_model)
+    _write_metadata(metadata_tmp_path, metadata, embed_model, dim, fingerprint)
+    os.replace(tmp_path, embeddings_path)
+    os.replace(metadata_tmp_path, metadata_path)
+
+    bank = ReferenceBank(metadata, np.load(embeddings_path, mmap_mode="r"), embed_model, fingerprint)
+    return bank, len(texts_to_embed)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Merge reference CSVs into the debias reference bank, embedding only new questions"
+    )
+    parser.add_argument(
+        "csv", nargs="+",
+        help="Reference CSVs with Question, Average_Human_Response and Average_LLM_Response columns"
+    )
+    parser.add_argument(
+        "--bank", default=DEFAULT_BANK_DIR,
+        help="Bank directory (embeddings.npy + metadata.parquet)"
+    )
+    parser.add_argument(
+        "--embed_model", type=str, default=PICKLE_EMBED_MODEL,
+        help="OpenAI embedding model"
+    )
+    args = parser.parse_args()
+
+    bank, n_embedded = ingest(args.csv, directory=args.bank, embed_model=args.embed_model)
+    print(f"{len(bank)} reference questions in {args.bank} ({n_embedded} new question texts), "
+          f"fingerprint {bank.fingerprint[:16]}")
@@ -0,0 +1,64 @@
+"""
+Deferred imports for heavy dependencies (crewai, boto3, the debias stack with
+sklearn/scipy/torch), so importing survey.py, survey_logic.py or server.py does
+not pay for them until a code path actually uses them.
+
+    Agent = lazy_import("crewai", "Agent")     # crewai is imported on the first Agent(...) call
+    boto3 = lazy_import("boto3")               # boto3 is imported on the first boto3.client(...)
+"""
+import importlib
+import threading
+
+
+class _LazyObject:
+    """Stand-in for a module or module attribute that is imported on first use."""
+
+    __slots__ = ("_module", "_attribute", "_target", "_lock")
+
+    def __init__(self, module, attribute=None):
+        object.__setattr__(self, "_module", module)
+        object.__setattr__(self, "_attribute", attribute)
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        target = object.__getattribute__(self, "_target")
+        if target is None:
+            with object.__getattribute__(self, "_lock"):
+                target = object.__getattribute__(self, "_target")
+                if target is None:
+                    target = importlib.import_module(object.__getattribute__(self, "_module"))
+                    attribute = object.__getattribute__(self, "_attribute")
+                    if attribute is not None:
+                        target = getattr(target, attribute)
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        module = object.__getattribute__(self, "_module")
+        attribute = object.__getattribute__(self, "_attribute")
+        name = f"{module}.{attribute}" if attribute else module
+        loaded = object.__getattribute__(self, "_target") is not None
+        return f"<lazy {name}{'' if loaded else ' (not imported yet)'}>"
+
+
+def lazy_import(module, attribute=None):
+    """
+    Args:
+        module: dotted module name, e.g. "crewai" or "debias.debias".
+        attribute: optional name inside the module, e.g. "Agent".
+
+    Returns:
+        A proxy that imports the module (and looks up the attribute) on first
+        attribute access or call, then forwards to the real object.
+    """
+    return _LazyObject(module, attribute)
@@ -2,10 +2,14 @@
 from flask import Flask, request, jsonify, send_from_directory
 from dotenv import load_dotenv
 import os
+import sys
+
+# simulate_response/ holds response_matrix and the simulation modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulate_response'))
 import survey_logic
+from response_matrix import ResponseMatrix
 import pandas as pd
 import json
-import tempfile
 from io import StringIO
 
 # Load environment variables from .env file
@@ -28,27 +32,11 @@ def set_api_keys(api_keys_dict):
 
 def restructure_data_for_debias(simulated_df, survey_context_dict):
     """
-    Restructure simulated data to match the format expected by the debias pipeline.
-    Expected format: [{"Question": "text", "llm_resp": [...]}, ...]
+    Restructure simulated data into the ResponseMatrix read by the debias pipeline.
+    Answer columns Q1, Q2, Q3... are matched to the survey's question texts.
     """
     questions = survey_context_dict.get('revised_survey', survey_context_dict).get('questions', [])
-    pipeline_input_data = []
-    
-    # Convert DataFrame columns (Q1, Q2, Q3...) to the expected format
-    for i, q_data in enumerate(questions):
-        question_text = q_data["question_text"]
-        answer_col_name = f"Q{i + 1}"
-        
-        if answer_col_name in simulated_df.columns:
-            # Get all responses for this question
-            answers = simulated_df[answer_col_name].tolist()
-            
-            pipeline_input_data.append({
-                "Question": question_text,
-                "llm_resp": answers  # This is the key field the debias pipeline expects
-            })
-    
-    return pipeline_input_data
+    return ResponseMatrix.from_dataframe(simulated_df, [q["question_text"] for q in questions])
 
 # --- API Endpoints ---
 
@@ -201,7 +189,7 @@ def simulate_data():
             template_path=temp_template_path,
             survey_context_path=temp_context_path,
             participant_csv_path=temp_participants_path
-        )
+        ).to_dataframe()
         
         # Clean up temporary files
         os.remove(temp_template_path)
@@ -239,32 +227,10 @@ def debias_data():
         survey_context_dict = json.loads(survey_context_str)
 
         # Restructure data for the debias pipeline
-        restructured_data = restructure_data_for_debias(simulated_df, survey_context_dict)
+        response_matrix = restructure_data_for_debias(simulated_df, survey_context_dict)
         
-        # Save restructured data to temporary file for debias pipeline
-        with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.json', encoding='utf-8') as tmp_input_file, \
-             tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.json', encoding='utf-8') as tmp_output_file:
-            
-            input_filepath = tmp_input_file.name
-            output_filepath = tmp_output_file.name
-
-            # Save the restructured data to the temporary input file
-            json.dump(restructured_data, tmp_input_file, indent=4)
-            tmp_input_file.flush()
-            
-            # Run the debias pipeline
-            survey_logic.run_debias_pipeline(input_json=input_filepath, output_json=output_filepath)
-            
-            # Read the debiased data back
-            with open(output_filepath, 'r', encoding='utf-8') as f:
-                debiased_data = json.load(f)
-            
-            # Clean up temporary files
-            os.unlink(input_filepath)
-            os.unlink(output_filepath)
-            
-            # Convert back to DataFrame format
-            debiased_df = pd.DataFrame(debiased_data)
+        # Debias in memory with the server's lazily loaded model
+        debiased_df = survey_logic.debias_simulated_data(response_matrix, survey_context_dict)
 
         # Return the debiased DataFrame as a JSON string
         result = {"debiasedOutput": debiased_df.to_json(orient='records')}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Fast, tolerant parser for simulated survey answers.
+'''
+
+import re
+import json
+
+# "Q3": 4, 'Q3': "Agree", Q3 = 4 ... anywhere in the text; tolerates fences, prose and truncation.
+ANSWER_PATTERN = re.compile(
+    r"""["']?(Q\d+)["']?\s*[:=]\s*("(?:[^"\\]|\\.)*"|'[^']*'|\[[^\]]*\]|-?\d+(?:\.\d+)?)""",
+    re.IGNORECASE
+)
+QUESTION_KEY = re.compile(r"^Q\d+$", re.IGNORECASE)
+BATCH_LABEL = re.compile(r"^P\d+$")
+LEADING_NUMBER = re.compile(r"^\s*(-?\d+(?:\.\d+)?)")
+OPTION_NUMBERING = re.compile(r"^\s*\d+\s*[-=.:)]\s*")
+
+
+class ReaskQueue:
+    """
+    Participants whose response had missing or invalid answers.
+
+    Each item is (row index, ParticipantID, {question key: reason}), so a
+    repair step can re-ask only those questions instead of dropping data.
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, index, participant_id, problems):
+        self.items.append((index, participant_id, dict(problems)))
+
+    def question_counts(self):
+        """Number of participants needing a re-ask, per question key."""
+        counts = {}
+        for _, _, problems in self.items:
+            for key in problems:
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class AnswerParser:
+    """
+    Extracts and validates the answer object of a simulated survey response.
+
+    Lookup tables for every question are built once; `parse` then handles
+    plain JSON, ```json fenced output, chatty prefixes/suffixes and truncated
+    objects in a single scan, coerces option text ("Strongly agree",
+    "7=Strongly agree", "3") to 1-based option numbers and checks each value
+    against the question's `input_config`.
+
+    Args:
+        questions: list of survey question dicts (question_text, input_type, input_config).
+    """
+
+    def __init__(self, questions):
+        self.questions = questions
+        self.keys = [f"Q{i+1}" for i in range(len(questions))]
+        self._specs = {key: self._compile(q) for key, q in zip(self.keys, questions)}
+
+    @staticmethod
+    def _compile(question):
+        config = question.get("input_config", {}) or {}
+        input_type = question.get("input_type", "multiple_choice")
+        options = config.get("options") or []
+        if input_type == "slider" or (not options and "min" in config and "max" in config):
+            return ("slider", float(config.get("min", 0)), float(config.get("max", 100)))
+        if input_type == "text_input":
+            return ("text",)
+        lookup = {}
+        for i, option in enumerate(options):
+            text = str(option).strip().lower()
+            lookup.setdefault(text, i + 1)
+            lookup.setdefault(OPTION_NUMBERING.sub("", text), i + 1)
+        kind = "multi" if input_type == "checkbox" else "choice"
+        return (kind, len(options), lookup)
+
+    @staticmethod
+    def extract(raw):
+        """
+        Return the raw {key: value} answer dict found in an LLM response.
+
+        Tries the whole `{...}` span with json.loads first (the common case),
+        accepting it, or a dict one level down (e.g. {"answers": {...}}), only
+        if it has `Qk` keys; a batched reply keyed by `Pn` labels is returned
+        whole. Otherwise falls back to scanning for `Qk: value`
+        pairs, which also recovers answers from truncated or malformed objects.
+        """
+        if isinstance(raw, dict):
+            return raw
+        if not isinstance(raw, str):
+            return {}
+        start = raw.find("{")
+        end = raw.rfind("}")
+        if start != -1 and end > start:
+            try:
+                parsed = json.loads(raw[start:end + 1])
+            except ValueError:
+                parsed = None
+            if isinstance(parsed, dict) and parsed and all(BATCH_LABEL.match(str(k)) for k in parsed):
+                # a batched reply {"P1": {...}, "P2": {...}}; split_batch_response picks the labels
+                return parsed
+            if isinstance(parsed, dict):
+                for candidate in (parsed, *parsed.values()):
+                    if isinstance(candidate, dict) and any(QUESTION_KEY.match(str(k)) for k in candidate):
+                        return candidate
+        found = {}
+        for key, value in ANSWER_PATTERN.findall(raw):
+            key = key.upper()
+            if key in found:
+                continue
+            if value[0] in "\"'":
+                value = value[1:-1]
+            elif value[0] == "[":
+                value = [v.strip(" \"'") for v in value[1:-1].split(",") if v.strip()]
+            else:
+                value = float(value) if "." in value else int(value)
+            found[key] = value
+        return found
+
+    def _coerce(self, spec, value):
+        """Return (value, None) if valid, else (None, reason)."""
+        kind = spec[0]
+        # Fast path for the common case: an in-range option number.
+        if type(value) is int and kind == "choice" and 1 <= value <= spec[1]:
+            return value, None
+        if kind == "text":
+            return (value, None) if value not in (None, "") else (None, "missing")
+        if kind == "multi":
+            values = value if isinstance(value, list) else [value]
+            coerced = []
+            for item in values:
+                item, reason = self._coerce(("choice",) + spec[1:], item)
+                if reason:
+                    return None, reason
+                coerced.append(item)
+            return (coerced, None) if coerced else (None, "missing")
+        if isinstance(value, bool) or value is None:
+            return None, "missing" if value is None else "not a number"
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if kind == "choice" and text in spec[2]:
+                return spec[2][text], None
+            match = LEADING_NUMBER.match(text)
+            if not match:
+                return None, "unknown option"
+            value = float(match.group(1))
+        if not isinstance(value, (int, float)):
+            return None, "not a number"
+        if kind == "slider":
+            if not spec[1] <= value <= spec[2]:
+                return None, "out of range"
+            return (int(value) if float(value).is_integer() else float(value)), None
+        if not float(value).is_integer() or not 1 <= value <= spec[1]:
+            return None, "out of range"
+        return int(value), None
+
+    def parse(self, raw):
+        """
+        Parse one response.
+
+        Returns:
+            (answers, problems): answers maps question key to the validated
+            value; problems maps each missing/invalid question key to a reason.
+        """
+        found = self.extract(raw)
+        if found and not all(isinstance(k, str) and k[:1] == "Q" for k in found):
+            found = {str(k).upper(): v for k, v in found.items()}
+        answers = {}
+        problems = {}
+        for key in self.keys:
+            if key not in found:
+                problems[key] = "missing"
+                continue
+            value, reason = self._coerce(self._specs[key], found[key])
+            if reason:
+                problems[key] = reason
+            else:
+                answers[key] = value
+        return answers, problems
+
+    def parse_many(self, raws, participant_ids=None):
+        """
+        Parse a sequence of responses.
+
+        Returns:
+            (answers, reask_queue): list of answer dicts, one per response, and
+            a ReaskQueue listing every response with missing/invalid answers.
+        """
+        queue = ReaskQueue()
+        parsed = []
+        for index, raw in enumerate(raws):
+            answers, problems = self.parse(raw)
+            parsed.append(answers)
+            if problems:
+                queue.add(index, participant_ids[index] if participant_ids is not None else index, problems)
+        return parsed, queue
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Pluggable LLM backends (OpenAI, Anthropic, offline mock) for the simulation.
+'''
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+import httpx
+import numpy as np
+
+
+class CallStats:
+    """Thread-safe per-call latency and token counters shared by all backends."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, latency, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.latencies.append(latency)
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+
+    @property
+    def calls(self):
+        return len(self.latencies)
+
+    def summary(self):
+        """Return call count, token totals and latency percentiles (seconds)."""
+        with self._lock:
+            latencies = np.asarray(self.latencies, dtype=float)
+            summary = {
+                "calls": len(latencies),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary.update({
+                "latency_mean": float(latencies.mean()),
+                "latency_p50": float(p50),
+                "latency_p95": float(p95),
+                "latency_p99": float(p99),
+            })
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+
+class LLMBackend:
+    """
+    Base class for LLM backends.
+
+    A backend is a drop-in `llm` callable for the simulation runners:
+    `backend(prompt)` returns the response text, and `await backend.acomplete(prompt)`
+    is its async variant, which the concurrent engine uses when available.
+    Every call records its latency and token counts in `backend.stats`.
+
+    Subclasses implement `_complete` and `_acomplete`, returning
+    (text, prompt_tokens, completion_tokens). Keyword overrides other than
+    model, temperature and max_tokens (e.g. top_p, stop) reach them as
+    `**params` and are forwarded to the provider request.
+
+    Args:
+        model: model name.
+        temperature: sampling temperature.
+        max_tokens: response length cap.
+    """
+
+    def __init__(self, model, temperature=0.7, max_tokens=150):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.stats = CallStats()
+
+    def _params(self, overrides):
+        params = {"model": self.model, "temperature": self.temperature, "max_tokens": self.max_tokens}
+        params.update({key: value for key, value in overrides.items() if value is not None})
+        return params
+
+    def __call__(self, prompt, **overrides):
+        start = time.perf_counter()
+        text, prompt_tokens, completion_tokens = self._complete(prompt, **self._params(overrides))
+        self.stats.record(time.perf_counter() - start, prompt_tokens, completion_tokens)
+        return text
+
+    async def acomplete(self, prompt, **overrides):
+        start = time.perf_counter()
+        text, prompt_tokens, completion_tokens = await self._acomplete(prompt, **self._params(overrides))
+        self.stats.record(time.perf_counter() - start, prompt_tokens, completion_tokens)
+        return text
+
+    def complete_n(self, prompt, n, **overrides):
+        """
+        Return `n` independent completions of `prompt`, drawn in a single
+        request where the provider supports it. Recorded as one call in `stats`.
+        """
+        start = time.perf_counter()
+        texts, prompt_tokens, completion_tokens = self._complete_n(prompt, n, **self._params(overrides))
+        self.stats.record(time.perf_counter() - start, prompt_tokens, completion_tokens)
+        return texts
+
+    async def acomplete_n(self, prompt, n, **overrides):
+        start = time.perf_counter()
+        texts, prompt_tokens, completion_tokens = await self._acomplete_n(prompt, n, **self._params(overrides))
+        self.stats.record(time.perf_counter() - start, prompt_tokens, completion_tokens)
+        return texts
+
+    def _complete(self, prompt, model, temperature, max_tokens, **params):
+        raise NotImplementedError
+
+    async def _acomplete(self, prompt, model, temperature, max_tokens, **params):
+        raise NotImplementedError
+
+    def _complete_n(self, prompt, n, **params):
+        # Providers without a multi-completion parameter: one request per sample.
+        results = [self._complete(prompt, **params) for _ in range(n)]
+        return [r[0] for r in results], sum(r[1] for r in results), sum(r[2] for r in results)
+
+    async def _acomplete_n(self, prompt, n, **params):
+        results = await asyncio.gather(*(self._acomplete(prompt, **params) for _ in range(n)))
+        return [r[0] for r in results], sum(r[1] for r in results), sum(r[2] for r in results)
+
+
+# Connection pool limits of the HTTP transports behind the SDK clients.
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+class _PooledHTTPBackend(LLMBackend):
+    """
+    Backend that reuses one SDK client, and so one pooled keep-alive HTTP
+    transport, for every call instead of connecting per request.
+
+    The sync client is built on first use. The async client is bound to the
+    event loop it was created on, so it is rebuilt when a new loop (e.g. a
+    new `asyncio.run`) uses the backend; `aclose` closes it at the end of a
+    run (the simulate_response sync runners do this). Both transports use
+    the same `http_limits`.
+    """
+
+    def __init__(self, model, temperature=0.7, max_tokens=150, api_key=None, timeout=60.0, max_retries=2,
+                 http_client=None, http_limits=None):
+        super().__init__(model, temperature, max_tokens)
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.http_client = http_client
+        self.http_limits = http_limits or HTTP_POOL_LIMITS
+        self._client = None
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    def _client_options(self):
+        return {"api_key": self.api_key, "timeout": self.timeout, "max_retries": self.max_retries}
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._make_client()
+            return self._client
+
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = self._make_async_client()
+            self._async_loop = loop
+        return self._async_client
+
+    async def aclose(self):
+        """Close the async client (and its connections) if it belongs to the running loop."""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = self._async_loop = None
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.close()
+
+    def _make_client(self):
+        raise NotImplementedError
+
+    def _make_async_client(self):
+        raise NotImplementedError
+
+
+class OpenAIBackend(_PooledHTTPBackend):
+    """
+    OpenAI chat completions backend.
+
+    Args:
+        model: OpenAI model to use.
+        temperature: creativity level.
+        max_tokens: response length cap.
+        api_key: defaults to the OPENAI_API_KEY environment variable.
+        base_url: optional API base URL (e.g. a local OpenAI-compatible server).
+        timeout: request timeout in seconds.
+        max_retries: SDK-level retries for failed requests.
+        http_client: optional custom sync HTTP client for the SDK.
+        http_limits: httpx.Limits for the pooled sync and async transports
+            (default HTTP_POOL_LIMITS; a custom http_client keeps its own).
+    """
+
+    def __init__(self, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150, api_key=None, base_url=None,
+                 timeout=60.0, max_retries=2, http_client=None, http_limits=None):
+        super().__init__(model, temperature, max_tokens, api_key or os.getenv("OPENAI_API_KEY"),
+                         timeout, max_retries, http_client, http_limits)
+        self.base_url = base_url
+
+    def _make_client(self):
+        import openai
+        http_client = self.http_client or openai.DefaultHttpxClient(limits=self.http_limits)
+        return openai.OpenAI(base_url=self.base_url, http_client=http_client, **self._client_options())
+
+    def _make_async_client(self):
+        import openai
+        http_client = openai.DefaultAsyncHttpxClient(limits=self.http_limits)
+        return openai.AsyncOpenAI(base_url=self.base_url, http_client=http_client, **self._client_options())
+
+    @staticmethod
+    def _unpack(response):
+        usage = response.usage
+        return (
+            response.choices[0].message.content.strip(),
+            getattr(usage, "prompt_tokens", 0),
+            getattr(usage, "completion_tokens", 0),
+        )
+
+    def _complete(self, prompt, model, temperature, max_tokens, **params):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **params
+        )
+        return self._unpack(response)
+
+    async def _acomplete(self, prompt, model, temperature, max_tokens, **params):
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **params
+        )
+        return self._unpack(response)
+
+    @staticmethod
+    def _unpack_n(response):
+        usage = response.usage
+        return (
+            [(choice.message.content or "").strip() for choice in response.choices],
+            getattr(usage, "prompt_tokens", 0),
+            getattr(usage, "completion_tokens", 0),
+        )
+
+    # The chat API samples n choices from one request; the prompt is billed once.
+    def _complete_n(self, prompt, n, model, temperature, max_tokens, **params):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            n=n,
+            **params
+        )
+        return self._unpack_n(response)
+
+    async def _acomplete_n(self, prompt, n, model, temperature, max_tokens, **params):
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            n=n,
+            **params
+        )
+        return self._unpack_n(response)
+
+
+class AnthropicBackend(_PooledHTTPBackend):
+    """
+    Anthropic messages API backend.
+
+    The messages API has no multi-completion parameter, so `complete_n`
+    issues `n` requests (concurrently in `acomplete_n`).
+
+    Args:
+        model: Anthropic model to use.
+        temperature: creativity level.
+        max_tokens: response length cap.
+        api_key: defaults to the ANTHROPIC_API_KEY environment variable.
+        timeout: request timeout in seconds.
+        max_retries: SDK-level retries for failed requests.
+        http_client: optional custom sync HTTP client for the SDK.
+        http_limits: httpx.Limits for the pooled sync and async transports
+            (default HTTP_POOL_LIMITS; a custom http_client keeps its own).
+    """
+
+    def __init__(self, model="claude-3-5-haiku-latest", temperature=0.7, max_tokens=150, api_key=None,
+                 timeout=60.0, max_retries=2, http_client=None, http_limits=None):
+        super().__init__(model, temperature, max_tokens, api_key or os.getenv("ANTHROPIC_API_KEY"),
+                         timeout, max_retries, http_client, http_limits)
+
+    def _make_client(self):
+        import anthropic
+        http_client = self.http_client or anthropic.DefaultHttpxClient(limits=self.http_limits)
+        return anthropic.Anthropic(http_client=http_client, **self._client_options())
+
+    def _make_async_client(self):
+        import anthropic
+        http_client = anthropic.DefaultAsyncHttpxClient(limits=self.http_limits)
+        return anthropic.AsyncAnthropic(http_client=http_client, **self._client_options())
+
+    @staticmethod
+    def _unpack(response):
+        text = "".join(block.text for block in response.content if getattr(block, "type", "") == "text")
+        return text.strip(), response.usage.input_tokens, response.usage.output_tokens
+
+    def _complete(self, prompt, model, temperature, max_tokens, **params):
+        response = self.client.messages.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **params
+        )
+        return self._unpack(response)
+
+    async def _acomplete(self, prompt, model, temperature, max_tokens, **params):
+        response = await self.async_client.messages.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **params
+        )
+        return self._unpack(response)
+
+
+QUESTION_PATTERN = re.compile(r"^Q(\d+): .*\nOptions: (.*)$", re.MULTILINE)
+PERSONA_PATTERN = re.compile(r"^\[(P\d+)\]\n(.*?)(?=\n\n\[P\d+\]|\n\nSurvey Theme:)", re.MULTILINE | re.DOTALL)
+
+
+class MockBackend(LLMBackend):
+    """
+    Deterministic offline backend for tests and benchmarks.
+
+    It understands the prompts built by CompiledSurveyPrompt: every "Qk:" with
+    an Options list gets an option number derived from a hash of the persona
+    description, the question number and `seed`, so a persona gets the same
+    answers whether it is asked alone or inside a batched prompt. Prompts
+    without survey questions get a single option number.
+
+    Latency is `latency` seconds plus `per_persona_latency` per persona in a
+    batch, scaled by a deterministic per-prompt jitter factor in
+    [1 - jitter, 1 + jitter]. `batch_error_rate` drops personas from batched
+    replies to exercise the single-persona fallback. `complete_n` returns
+    `n` distinct deterministic samples per persona (sample 0 matches the
+    single-completion answer). Token counts are estimated as characters / 4.
+
+    Args:
+        latency: base seconds per request.
+        jitter: relative latency jitter in [0, 1).
+        per_persona_latency: extra seconds per persona in batched prompts.
+        batch_error_rate: probability of omitting a persona from a batched reply.
+        seed: seed for answers, jitter and dropped personas.
+    """
+
+    def __init__(self, model="mock", temperature=0.7, max_tokens=150, latency=0.0, jitter=0.0,
+                 per_persona_latency=0.0, batch_error_rate=0.0, seed=0):
+        super().__init__(model, temperature, max_tokens)
+        self.latency = latency
+        self.jitter = jitter
+        self.per_persona_latency = per_persona_latency
+        self.batch_error_rate = batch_error_rate
+        self.seed = seed
+
+    def _hash(self, *parts):
+        digest = hashlib.sha256("|".join(str(p) for p in (self.seed,) + parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def _answers(self, persona, questions, sample=0):
+        extra = (sample,) if sample else ()
+        return {
+            f"Q{number}": self._hash(persona, number, *extra) % len(options) + 1
+            for number, options in questions
+        }
+
+    def _respond(self, prompt, sample=0):
+        """Return (text, delay) for a prompt."""
+        questions = [(int(m.group(1)), m.group(2).split(", ")) for m in QUESTION_PATTERN.finditer(prompt)]
+        personas = PERSONA_PATTERN.findall(prompt)
+        rng = random.Random(self._hash(prompt))
+        delay = (self.latency + self.per_persona_latency * max(1, len(personas))) \
+            * (1 + self.jitter * (2 * rng.random() - 1))
+        if not questions:
+            return str((rng.randint(1, 7) + sample - 1) % 7 + 1), delay
+        if not personas:
+            background = prompt.split("\n\nSurvey Theme:", 1)[0].strip()
+            return json.dumps(self._answers(background, questions, sample)), delay
+        reply = {
+            label: self._answers(background.strip(), questions, sample)
+            for label, background in personas
+            if rng.random() >= self.batch_error_rate
+        }
+        return json.dumps(reply), delay
+
+    def _complete(self, prompt, model, temperature, max_tokens, **params):
+        text, delay = self._respond(prompt)
+        if delay > 0:
+            time.sleep(delay)
+        return text, len(prompt) // 4, len(text) // 4
+
+    async def _acomplete(self, prompt, model, temperature, max_tokens, **params):
+        text, delay = self._respond(prompt)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return text, len(prompt) // 4, len(text) // 4
+
+    def _complete_n(self, prompt, n, model, temperature, max_tokens, **params):
+        replies = [self._respond(prompt, sample) for sample in range(n)]
+        delay = replies[0][1]
+        if delay > 0:
+            time.sleep(delay)
+        texts = [text for text, _ in replies]
+        return texts, len(prompt) // 4, sum(len(text) for text in texts) // 4
+
+    async def _acomplete_n(self, prompt, n, model, temperature, max_tokens, **params):
+        replies = [self._respond(prompt, sample) for sample in range(n)]
+        delay = replies[0][1]
+        if delay > 0:
+            await asyncio.sleep(delay)
+        texts = [text for text, _ in replies]
+        return texts, len(prompt) // 4, sum(len(text) for text in texts) // 4
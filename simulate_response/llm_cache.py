@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Persistent prompt -> response cache for simulated participants.
+'''
+
+import os
+import json
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import Counter
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite")
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses backed by SQLite.
+
+    Entries are keyed on a SHA-256 of (model, temperature, sample index,
+    prompt and any other generation parameters). When the stored responses
+    exceed `max_bytes`, the least recently used entries are evicted down to
+    90% of the budget. Hits buffer their access time and write it in batches
+    (with the next `put`, eviction, `flush_access_times` or `close`), not one
+    commit per hit.
+
+    Args:
+        path: SQLite database file.
+        max_bytes: size budget for stored responses (default 256 MB).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._accessed = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    # Buffered access times are written once this many hits are pending.
+    ACCESS_FLUSH_SIZE = 256
+    # Eviction frees space down to this fraction of max_bytes.
+    EVICT_LOW_WATER = 0.9
+
+    @staticmethod
+    def make_key(model, temperature, sample_index, prompt, params=None):
+        """
+        Return the cache key for one LLM request; `params` holds any other
+        generation parameters (max_tokens, ...) that change the response.
+        """
+        digest = hashlib.sha256()
+        parts = [str(model), repr(float(temperature)), str(int(sample_index)), prompt]
+        if params:
+            parts.append(json.dumps(params, sort_keys=True, default=str))
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached response for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.ACCESS_FLUSH_SIZE:
+                self._write_access_times()
+                self._conn.commit()
+            return row[0]
+
+    def _write_access_times(self):
+        if self._accessed:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def flush_access_times(self):
+        """Write the buffered access times of recent hits."""
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+
+    def put(self, key, response):
+        """Store `response` under `key`, evicting old entries if over budget."""
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._write_access_times()
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache is at EVICT_LOW_WATER
+        of its budget, so the next few puts do not each trigger another pass.
+        """
+        target = self.max_bytes * self.EVICT_LOW_WATER
+        cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access")
+        doomed = []
+        # walk the last_access index only as far as needed instead of fetching the whole table
+        for key, size in cursor:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._write_access_times()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CachedLLM:
+    """
+    Drop-in replacement for an LLM callable that consults a ResponseCache first.
+
+    Identical prompts (e.g. two participants with the same Age, Gender and Race)
+    are still independent samples: the n-th occurrence of a prompt within one
+    CachedLLM is stored under sample index n, so re-running an unchanged survey
+    replays every sample without a network call.
+
+    When the wrapped llm has native async (`acomplete`, e.g. an LLMBackend),
+    CachedLLM exposes `acomplete`/`acomplete_n` too, so async runners await the
+    backend directly instead of going through a worker thread.
+
+    Args:
+        llm: callable accepting (prompt, model=..., temperature=...), e.g. openai_llm
+            or an LLMBackend.
+        cache: ResponseCache instance.
+        model: model name forwarded to `llm` and used in the cache key
+            (defaults to the backend's model, or gpt-3.5-turbo).
+        temperature: sampling temperature forwarded to `llm` and used in the cache key
+            (defaults to the backend's temperature, or 0.7).
+        max_tokens: response length cap forwarded to `llm` and used in the cache key
+            (defaults to the backend's max_tokens; not forwarded if neither is set).
+        **llm_kwargs: extra keyword arguments forwarded to `llm` and used in the cache key.
+    """
+
+    def __init__(self, llm, cache, model=None, temperature=None, max_tokens=None, **llm_kwargs):
+        self.llm = llm
+        self.cache = cache
+        self.model = model if model is not None else getattr(llm, "model", "gpt-3.5-turbo")
+        self.temperature = temperature if temperature is not None else getattr(llm, "temperature", 0.7)
+        self.max_tokens = max_tokens if max_tokens is not None else getattr(llm, "max_tokens", None)
+        self.llm_kwargs = llm_kwargs
+        self._occurrences = Counter()
+        self._lock = threading.Lock()
+        if hasattr(llm, "acomplete"):
+            self.acomplete = self._acomplete
+            self.acomplete_n = self._acomplete_n
+        if hasattr(llm, "aclose"):
+            self.aclose = llm.aclose
+
+    @property
+    def _call_kwargs(self):
+        """Keyword arguments forwarded to the wrapped llm."""
+        kwargs = dict(model=self.model, temperature=self.temperature, **self.llm_kwargs)
+        if self.max_tokens is not None:
+            kwargs["max_tokens"] = self.max_tokens
+        return kwargs
+
+    def _keys(self, prompt, n):
+        """Cache keys for the next `n` samples of `prompt`."""
+        with self._lock:
+            first = self._occurrences[prompt]
+            self._occurrences[prompt] += n
+        params = {key: value for key, value in self._call_kwargs.items() if key not in ("model", "temperature")}
+        return [ResponseCache.make_key(self.model, self.temperature, first + i, prompt, params) for i in range(n)]
+
+    def __call__(self, prompt):
+        key = self._keys(prompt, 1)[0]
+        response = self.cache.get(key)
+        if response is None:
+            response = self.llm(prompt, **self._call_kwargs)
+            self.cache.put(key, response)
+        return response
+
+    async def _acomplete(self, prompt):
+        key = self._keys(prompt, 1)[0]
+        response = self.cache.get(key)
+        if response is None:
+            response = await self.llm.acomplete(prompt, **self._call_kwargs)
+            self.cache.put(key, response)
+        return response
+
+    def complete_n(self, prompt, n):
+        """
+        Return `n` samples for `prompt`. Cached samples are replayed and only
+        the missing ones are requested, in a single `complete_n` call when the
+        wrapped llm supports it.
+        """
+        keys = self._keys(prompt, n)
+        responses = [self.cache.get(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            if hasattr(self.llm, "complete_n"):
+                fresh = self.llm.complete_n(prompt, len(missing), **self._call_kwargs)
+            else:
+                fresh = [self.llm(prompt, **self._call_kwargs) for _ in missing]
+            for i, response in zip(missing, fresh):
+                self.cache.put(keys[i], response)
+                responses[i] = response
+        return responses
+
+    async def _acomplete_n(self, prompt, n):
+        keys = self._keys(prompt, n)
+        responses = [self.cache.get(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            if hasattr(self.llm, "acomplete_n"):
+                fresh = await self.llm.acomplete_n(prompt, len(missing), **self._call_kwargs)
+            else:
+                fresh = await asyncio.gather(*(self.llm.acomplete(prompt, **self._call_kwargs) for _ in missing))
+            for i, response in zip(missing, fresh):
+                self.cache.put(keys[i], response)
+                responses[i] = response
+        return responses
+
+    def reset_samples(self):
+        """Start sample indices from zero again, e.g. before a new simulation run."""
+        with self._lock:
+            self._occurrences.clear()
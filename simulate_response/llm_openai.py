@@ -1,10 +1,29 @@
 # llm_openai.py
-import openai
 import os
+import threading
 from dotenv import load_dotenv
+from llm_backends import OpenAIBackend
 load_dotenv()
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_openai_backend():
+    """
+    Shared OpenAIBackend used by `openai_llm`.
+
+    The client (and its pooled HTTP transport) is created on first use rather
+    than at import time, and rebuilt if OPENAI_API_KEY changes, e.g. after the
+    server sets the key sent with a request.
+    """
+    global _backend
+    api_key = os.getenv("OPENAI_API_KEY")
+    with _backend_lock:
+        if _backend is None or _backend.api_key != api_key:
+            _backend = OpenAIBackend(api_key=api_key)
+        return _backend
+
 
 def openai_llm(prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150):
     """
@@ -19,13 +38,7 @@ def openai_llm(prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150):
     Returns:
         response string.
     """
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
-    return response.choices[0].message.content.strip()
+    return get_openai_backend()(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
 
 if __name__ == "__main__":
-    print(f"Key is: {os.getenv('OPENAI_API_KEY')}")
\ No newline at end of file
+    print(f"Key is: {os.getenv('OPENAI_API_KEY')}")
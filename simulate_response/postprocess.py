@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Chunked, multi-process parsing of raw LLM responses into columnar answer blocks.
+'''
+
+import os
+import math
+import concurrent.futures
+
+import numpy as np
+
+from answer_parser import AnswerParser, ReaskQueue
+
+# Below this many responses the process start-up cost outweighs the parallel speed-up.
+MIN_PARALLEL_RESPONSES = 20_000
+# Smallest chunk worth shipping to a worker when the chunk size is derived from the input.
+MIN_CHUNK_SIZE = 2_000
+
+_worker_parser = None
+
+
+def _init_worker(questions):
+    """Build the AnswerParser once per worker process instead of once per chunk."""
+    global _worker_parser
+    _worker_parser = AnswerParser(questions)
+
+
+def _empty_block(parser, n):
+    """
+    Columns for `n` responses: numeric questions (choice, slider) are float32
+    with NaN for missing answers; text and checkbox questions are object arrays.
+    """
+    block = {}
+    for key in parser.keys:
+        if parser._specs[key][0] in ("choice", "slider"):
+            block[key] = np.full(n, np.nan, dtype=np.float32)
+        else:
+            block[key] = np.full(n, None, dtype=object)
+    return block
+
+
+def _parse_chunk(raws, offset, parser=None):
+    """
+    Parse one chunk of responses into a columnar block.
+
+    Returns:
+        (block, problems): dict of question key -> column array for the chunk,
+        and a list of (global row index, {question key: reason}).
+    """
+    parser = parser or _worker_parser
+    block = _empty_block(parser, len(raws))
+    problems = []
+    for i, raw in enumerate(raws):
+        answers, issues = parser.parse(raw)
+        for key, value in answers.items():
+            block[key][i] = value
+        if issues:
+            problems.append((offset + i, issues))
+    return block, problems
+
+
+def parse_responses(questions, raws, participant_ids=None, max_workers=None, chunk_size=None):
+    """
+    Parse and validate raw LLM responses into answer columns, fanning chunks
+    out over a ProcessPoolExecutor.
+
+    Each worker returns a columnar block for its chunk; blocks are
+    concatenated per column, so no per-row dicts cross process boundaries or
+    reach the DataFrame constructor. Small inputs (or max_workers=1) are
+    parsed in-process.
+
+    Args:
+        questions: list of survey question dicts.
+        raws: sequence of raw response strings.
+        participant_ids: optional ParticipantIDs aligned with `raws`, for the ReaskQueue.
+        max_workers: worker processes (default: CPU count).
+        chunk_size: responses per chunk (default: an even split over the
+            workers, at least MIN_CHUNK_SIZE).
+
+    Returns:
+        (columns, reask_queue): dict of question key ("Q1", ...) -> array of
+        length len(raws), and a ReaskQueue of rows with missing/invalid answers.
+    """
+    raws = list(raws)
+    parser = AnswerParser(questions)
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE, math.ceil(len(raws) / max_workers))
+    offsets = range(0, len(raws), chunk_size)
+    if min(max_workers, len(offsets)) == 1 or len(raws) < MIN_PARALLEL_RESPONSES:
+        results = [_parse_chunk(raws[start:start + chunk_size], start, parser) for start in offsets]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(max_workers, len(offsets)), initializer=_init_worker, initargs=(questions,)
+        ) as executor:
+            futures = [executor.submit(_parse_chunk, raws[start:start + chunk_size], start) for start in offsets]
+            results = [future.result() for future in futures]
+
+    if results:
+        columns = {key: np.concatenate([block[key] for block, _ in results]) for key in parser.keys}
+    else:
+        columns = _empty_block(parser, 0)
+    reask_queue = ReaskQueue()
+    for _, problems in results:
+        for index, issues in problems:
+            reask_queue.add(index, participant_ids[index] if participant_ids is not None else index, issues)
+    return columns, reask_queue
+
+
+def queued_participants(responses_df, reask_queue):
+    """
+    participant_info dicts for only the rows listed in `reask_queue`, keyed by
+    row index, for `repair_missing_answers` (avoids converting every row).
+    """
+    rows = [index for index, _, _ in reask_queue]
+    columns = [column for column in responses_df.columns if column != "Response"]
+    return dict(zip(rows, responses_df.iloc[rows][columns].to_dict(orient="records")))
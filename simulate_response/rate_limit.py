@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Rate limiting primitives for the concurrent simulation engine.
+'''
+
+import asyncio
+import concurrent.futures
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+# Statuses worth retrying after backing off: throttling, timeouts and server errors.
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; each
+    `acquire` consumes tokens and sleeps until enough are available.
+
+    Args:
+        rate: sustained number of requests allowed per second.
+        capacity: maximum burst size (defaults to max(1, rate)).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self._lock_loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available and consume them."""
+        if tokens > self.capacity:
+            raise ValueError("Cannot acquire more tokens than the bucket capacity")
+        # The lock is created lazily so the bucket can be built outside a running loop,
+        # and rebuilt when the bucket is reused from another loop (each asyncio.run).
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def run_coroutine_sync(coro):
+    """Run `coro` to completion, even when called from inside a running event loop (e.g. Jupyter)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After (or retry-after-ms) response header, or None."""
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc):
+    """
+    Classify an exception raised by an LLM or embedding call.
+
+    Works with the OpenAI and Anthropic SDK errors (status_code / response
+    attributes, *Timeout* and *Connection* error classes) and plain timeouts.
+
+    Returns:
+        (retryable, retry_after): whether the call signals overload and should
+        be retried after backing off, and the server's Retry-After in seconds (or None).
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    name = type(exc).__name__
+    retryable = (
+        isinstance(exc, (asyncio.TimeoutError, TimeoutError))
+        or "Timeout" in name
+        or "Connection" in name
+        or status in RETRYABLE_STATUS
+        or (isinstance(status, int) and status >= 500)
+    )
+    return retryable, _retry_after(response) if retryable else None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD (additive-increase, multiplicative-decrease) concurrency limiter.
+
+    The window of requests allowed in flight grows by about one per window's
+    worth of successful calls while latency stays within `latency_tolerance`
+    times the baseline (the lowest recent latency), and holds when latency
+    climbs. A 429, timeout or 5xx multiplies the window by `backoff` (at most
+    once per baseline latency, so a burst of errors counts as one congestion
+    event), pauses new requests for the server's Retry-After, and the call is
+    retried with jittered exponential backoff.
+
+    `limit` is the current window; `metrics()` returns it with the counters.
+    When wrapping an SDK client, construct it with max_retries=0 so throttling
+    reaches the limiter instead of being retried inside the SDK.
+
+    Args:
+        initial_limit: starting window.
+        min_limit: smallest window.
+        max_limit: largest window.
+        backoff: multiplicative decrease factor in (0, 1).
+        latency_tolerance: latency / baseline ratio still considered stable.
+        max_retries: retries per call on retryable errors.
+        base_delay: first retry delay in seconds without a Retry-After header.
+        max_delay: cap on the retry delay.
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, backoff=0.5, latency_tolerance=2.0,
+                 max_retries=6, base_delay=0.5, max_delay=30.0):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Expected 1 <= min_limit <= initial_limit <= max_limit")
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be in (0, 1)")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._window = float(initial_limit)
+        self._baseline = None
+        self._last_decrease = float("-inf")
+        self._paused_until = 0.0
+        self._condition = None
+        self._condition_loop = None
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.failures = 0
+        self.retries = 0
+        self.history = [(time.monotonic(), initial_limit)]
+
+    @property
+    def limit(self):
+        """Current concurrency window."""
+        return max(self.min_limit, min(self.max_limit, int(self._window)))
+
+    def metrics(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "retries": self.retries,
+            "latency_baseline": self._baseline,
+        }
+
+    def _set_window(self, window):
+        before = self.limit
+        self._window = max(float(self.min_limit), min(float(self.max_limit), window))
+        if self.limit != before:
+            self.history.append((time.monotonic(), self.limit))
+
+    async def acquire(self):
+        """Wait for a free slot in the window (and for any Retry-After pause to end)."""
+        # Created lazily so the limiter can be built outside a running loop, and
+        # rebuilt when it is reused from another loop (e.g. a repair pass or the
+        # next embedding chunk, each under its own asyncio.run). The AIMD window
+        # and counters carry over; only the loop-bound primitive is replaced.
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                else:
+                    await self._condition.wait()
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """Record a successful call; grow the window if latency is stable and the window is in use."""
+        self.successes += 1
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # Let the baseline drift up slowly so a permanently slower service is not read as congestion.
+            self._baseline *= 1.01
+        if latency <= self.latency_tolerance * self._baseline and self.in_flight >= self.limit - 1:
+            self._set_window(self._window + 1.0 / self._window)
+
+    def on_congestion(self, retry_after=None):
+        """Record a throttled/timed-out/5xx call: shrink the window and honour Retry-After."""
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= (self._baseline or 0.0):
+            self._set_window(self._window * self.backoff)
+            self._last_decrease = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Await `fn(*args, **kwargs)` inside the window, retrying retryable errors.
+
+        Non-retryable errors, and retryable ones after `max_retries`, are re-raised.
+        """
+        attempt = 0
+        while True:
+            await self.acquire()
+            start = time.monotonic()
+            try:
+                result = await fn(*args, **kwargs)
+                self.on_success(time.monotonic() - start)
+                return result
+            except Exception as exc:
+                retryable, retry_after = classify_error(exc)
+                if not retryable:
+                    self.failures += 1
+                    raise
+                self.on_congestion(retry_after)
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = retry_after if retry_after is not None else \
+                    min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            finally:
+                # Also runs on CancelledError (not an Exception), so a cancelled call gives its slot back.
+                await self.release()
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Columnar participants x questions answer store shared by the
+simulation, the server and the debias pipeline.
+'''
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# Missing cells in int16 matrices; float32 matrices use NaN.
+MISSING_INT16 = np.iinfo(np.int16).min
+QUESTION_COLUMN = re.compile(r"^Q\d+$")
+
+
+class ResponseMatrix:
+    """
+    Answers of every participant to every question in one 2-D array.
+
+    `answers` has shape (n_participants, n_questions) and is stored
+    column-major, so `question(q)` returns a contiguous, zero-copy view of one
+    question's answers. float32 matrices mark missing cells with NaN (and can
+    hold slider or debiased values); int16 matrices hold option numbers and
+    mark missing cells with MISSING_INT16. Non-numeric answers (text input,
+    checkbox lists) are kept beside the matrix in `other_answers`.
+
+    Args:
+        answers: array of shape (n_participants, n_questions).
+        question_ids: question keys ("Q1", ...), one per column.
+        participant_ids: ParticipantIDs, one per row (default: row numbers).
+        question_texts: optional question texts, one per column.
+        dtype: np.float32 or np.int16.
+        other_answers: optional dict of question key -> object array (one
+            entry per participant) for questions with non-numeric answers.
+    """
+
+    def __init__(self, answers, question_ids, participant_ids=None, question_texts=None, dtype=np.float32,
+                 other_answers=None):
+        dtype = np.dtype(dtype)
+        if dtype not in (np.dtype(np.float32), np.dtype(np.int16)):
+            raise ValueError("ResponseMatrix answers must be float32 or int16")
+        answers = np.asarray(answers)
+        if answers.ndim != 2:
+            raise ValueError("answers must be a 2-D (participants x questions) array")
+        if dtype == np.int16 and answers.dtype.kind == "f":
+            answers = np.where(np.isnan(answers), MISSING_INT16, np.rint(answers))
+        self.answers = np.asfortranarray(answers, dtype=dtype)
+        n_participants, n_questions = self.answers.shape
+        self.question_ids = np.asarray(question_ids, dtype=str)
+        if len(self.question_ids) != n_questions:
+            raise ValueError("question_ids must have one entry per column")
+        self.participant_ids = np.asarray(
+            participant_ids if participant_ids is not None else np.arange(n_participants)
+        ).astype(str)
+        if len(self.participant_ids) != n_participants:
+            raise ValueError("participant_ids must have one entry per row")
+        self.question_texts = None if question_texts is None else np.asarray(question_texts, dtype=str)
+        if self.question_texts is not None and len(self.question_texts) != n_questions:
+            raise ValueError("question_texts must have one entry per column")
+        self.other_answers = {key: np.asarray(column, dtype=object) for key, column in (other_answers or {}).items()}
+        if any(len(column) != n_participants for column in self.other_answers.values()):
+            raise ValueError("other_answers columns must have one entry per row")
+        self._positions = {key: j for j, key in enumerate(self.question_ids)}
+
+    @classmethod
+    def from_columns(cls, columns, participant_ids=None, question_texts=None, dtype=np.float32):
+        """
+        Build from a dict of question key -> answer column (e.g. the output of
+        postprocess.parse_responses). Numeric columns form the matrix;
+        non-numeric ones (text/checkbox) go to `other_answers`.
+        `question_texts`, if given, has one entry per column of `columns`.
+        """
+        if question_texts is not None and len(question_texts) != len(columns):
+            raise ValueError(f"Got {len(question_texts)} question texts for {len(columns)} answer columns")
+        keys = [key for key, column in columns.items() if np.asarray(column).dtype.kind in "iuf"]
+        other_answers = {key: column for key, column in columns.items() if key not in set(keys)}
+        n = len(next(iter(columns.values()))) if columns else 0
+        answers = np.empty((n, len(keys)), dtype=np.float32, order="F")
+        for j, key in enumerate(keys):
+            answers[:, j] = columns[key]
+        if question_texts is not None:
+            texts = dict(zip(columns, question_texts))
+            question_texts = [texts[key] for key in keys]
+        return cls(answers, keys, participant_ids, question_texts, dtype, other_answers)
+
+    @classmethod
+    def from_dataframe(cls, df, question_texts=None, id_column="ParticipantID", dtype=np.float32):
+        """
+        Build from a DataFrame with Q1, Q2, ... answer columns (and optionally
+        ParticipantID). `question_texts` lists the survey's questions in order,
+        so column Qk takes question_texts[k - 1]. Columns that are not numeric
+        go to `other_answers`.
+        """
+        keys = [column for column in df.columns if QUESTION_COLUMN.match(str(column))]
+        columns = {}
+        for key in keys:
+            numeric = pd.to_numeric(df[key], errors="coerce")
+            numeric_answers = numeric.notna().sum() == df[key].notna().sum()
+            columns[key] = numeric.to_numpy(dtype=np.float32) if numeric_answers else df[key].to_numpy(dtype=object)
+        participant_ids = df[id_column].to_numpy() if id_column in df.columns else None
+        if question_texts is not None:
+            positions = [int(key[1:]) - 1 for key in keys]
+            if any(p >= len(question_texts) for p in positions):
+                raise ValueError(f"Got {len(question_texts)} question texts for answer columns up to "
+                                 f"Q{max(positions) + 1}")
+            question_texts = [question_texts[p] for p in positions]
+        return cls.from_columns(columns, participant_ids, question_texts, dtype)
+
+    @property
+    def shape(self):
+        return self.answers.shape
+
+    @property
+    def n_participants(self):
+        return self.answers.shape[0]
+
+    @property
+    def n_questions(self):
+        return self.answers.shape[1]
+
+    def __len__(self):
+        return self.n_participants
+
+    def _position(self, question):
+        return self._positions[question] if isinstance(question, str) else int(question)
+
+    def missing_mask(self):
+        """Boolean (n_participants, n_questions) array, True where the answer is missing."""
+        if self.answers.dtype == np.int16:
+            return self.answers == MISSING_INT16
+        return np.isnan(self.answers)
+
+    def float_answers(self):
+        """float32 copy of the answers with NaN in missing cells (int16 sentinels included)."""
+        answers = self.answers.astype(np.float32)
+        if self.answers.dtype == np.int16:
+            answers[self.missing_mask()] = np.nan
+        return answers
+
+    def question(self, question):
+        """Zero-copy view of one question's answers (by key "Q3" or column index), missing cells included."""
+        return self.answers[:, self._position(question)]
+
+    def responses(self, question):
+        """Valid answers to one question; a view when nothing is missing, else a compacted copy."""
+        column = self.question(question)
+        missing = column == MISSING_INT16 if column.dtype == np.int16 else np.isnan(column)
+        return column if not missing.any() else column[~missing]
+
+    def with_answers(self, answers):
+        """New matrix with the same participants and questions and different answer values."""
+        answers = np.asarray(answers)
+        dtype = np.float32 if answers.dtype.kind == "f" else self.answers.dtype
+        return ResponseMatrix(answers, self.question_ids, self.participant_ids, self.question_texts, dtype,
+                              self.other_answers)
+
+    def to_dataframe(self):
+        """
+        DataFrame with one Qk column per question (numeric and `other_answers`,
+        in question order), indexed by ParticipantID. Whole-number columns use
+        the nullable Int64 dtype, so option numbers stay integers.
+        """
+        answers = self.float_answers() if self.answers.dtype == np.int16 else self.answers
+        index = pd.Index(self.participant_ids, name="ParticipantID")
+        df = pd.DataFrame(answers, columns=list(self.question_ids), index=index)
+        for key in df.columns:
+            column = answers[:, self._positions[key]]
+            if np.array_equal(column, np.rint(column), equal_nan=True):
+                df[key] = df[key].astype("Int64")
+        for key, column in self.other_answers.items():
+            df[key] = column
+        order = sorted(df.columns, key=lambda key: int(key[1:]) if QUESTION_COLUMN.match(key) else float("inf"))
+        return df[order]
+
+    def to_debias_items(self):
+        """
+        Debias pipeline input: [{"Question": text, "llm_resp": [...]}, ...],
+        one item per question, with missing answers left out.
+        """
+        texts = self.question_texts if self.question_texts is not None else self.question_ids
+        return [
+            {"Question": str(text), "llm_resp": self.responses(j).tolist()}
+            for j, text in enumerate(texts)
+        ]
+
+    def save(self, path):
+        """
+        Save to `.npz` or, with pyarrow installed, to an Arrow IPC file
+        (`.arrow` / `.feather`) with one column per question. Only the numeric
+        matrix is saved, not `other_answers`.
+        """
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix not in (".npz", ".arrow", ".feather"):
+            # np.savez would silently append .npz, and load(path) would not find the file
+            raise ValueError(f"ResponseMatrix files end in .npz, .arrow or .feather, got {path!r}")
+        if suffix in (".arrow", ".feather"):
+            import pyarrow as pa
+            import pyarrow.feather as feather
+            table = pa.table(
+                {"ParticipantID": self.participant_ids, **{
+                    key: self.answers[:, j] for j, key in enumerate(self.question_ids)
+                }},
+                metadata={} if self.question_texts is None else {
+                    "question_texts": "\x1f".join(self.question_texts)
+                }
+            )
+            feather.write_feather(table, path)
+            return
+        arrays = {
+            "answers": self.answers,
+            "question_ids": self.question_ids,
+            "participant_ids": self.participant_ids,
+        }
+        if self.question_texts is not None:
+            arrays["question_texts"] = self.question_texts
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Load a matrix written by `save`; `mmap` memory-maps Arrow files instead of reading them."""
+        if os.path.splitext(path)[1].lower() in (".arrow", ".feather"):
+            import pyarrow.feather as feather
+            table = feather.read_table(path, memory_map=mmap)
+            metadata = table.schema.metadata or {}
+            texts = metadata.get(b"question_texts")
+            keys = [name for name in table.column_names if name != "ParticipantID"]
+            answers = np.column_stack([table.column(key).to_numpy() for key in keys]) if keys else \
+                np.empty((table.num_rows, 0), dtype=np.float32)
+            return cls(answers, keys, table.column("ParticipantID").to_numpy(),
+                       texts.decode("utf-8").split("\x1f") if texts else None, answers.dtype)
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["answers"], data["question_ids"], data["participant_ids"],
+                data["question_texts"] if "question_texts" in data else None, data["answers"].dtype
+            )
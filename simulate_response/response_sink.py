@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Append-only JSONL sink so long simulation runs can resume after a crash.
+'''
+
+import os
+import json
+import threading
+
+
+def _json_default(value):
+    """Serialize NumPy scalars (e.g. Age read by pandas) as plain Python values."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonlResponseSink:
+    """
+    Append-only JSONL file holding one simulated response record per line.
+
+    Every record is flushed as soon as it is appended, so a crash loses at
+    most the line being written. On open, a torn trailing line left by a
+    crash is truncated away and the completed records are loaded, keyed by
+    ParticipantID, so the simulator can skip them on restart.
+
+    Args:
+        path: JSONL file to append to (created if missing).
+        fsync: also fsync after every record (slower, survives power loss).
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self.records = self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        good_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                records[record["ParticipantID"]] = record
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+        return records
+
+    def completed_ids(self):
+        """ParticipantIDs already present in the sink."""
+        return set(self.records)
+
+    def append(self, record):
+        """Write one record and flush it to disk."""
+        line = json.dumps(record, ensure_ascii=False, default=_json_default) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records[record["ParticipantID"]] = json.loads(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
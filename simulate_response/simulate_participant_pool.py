@@ -9,11 +9,11 @@
 @Desc    :   None
 '''
 
-import pandas as pd
-import random
-import uuid
 import os
 
+import numpy as np
+import pandas as pd
+
 # === Step 1: Define allowed race categories ===
 allowed_races = {
     "White": "White",
@@ -25,6 +25,197 @@ allowed_races = {
 
 allowed_genders = ["Male", "Female"]
 
+DEFAULT_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "participant_pool.csv")
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def _normalize_distribution(dist, labels, name):
+    """Return probabilities aligned with `labels`, renormalized to sum to 1."""
+    if dist is None:
+        return np.full(len(labels), 1.0 / len(labels))
+    unknown = set(dist) - set(labels)
+    if unknown:
+        raise ValueError(f"Unknown {name} categories: {sorted(unknown)}")
+    weights = np.array([float(dist.get(label, 0.0)) for label in labels])
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError(f"{name} distribution must be non-negative and sum to a positive value")
+    return weights / weights.sum()
+
+
+def _sample_categories(rng, labels, probabilities, n):
+    """Vectorized inverse-CDF draw of `n` labels."""
+    cdf = np.cumsum(probabilities)
+    cdf[-1] = 1.0
+    return np.asarray(labels, dtype=object)[np.searchsorted(cdf, rng.random(n), side="right")]
+
+
+def _uuid4_strings(rng, n):
+    """Draw `n` random version-4 UUID strings from `rng` without a per-row Python loop."""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    hex_digits = np.empty((n, 32), dtype=np.uint8)
+    hex_digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    hex_digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    chars = np.full((n, 36), ord("-"), dtype=np.uint8)
+    chars[:, 0:8] = hex_digits[:, 0:8]
+    chars[:, 9:13] = hex_digits[:, 8:12]
+    chars[:, 14:18] = hex_digits[:, 12:16]
+    chars[:, 19:23] = hex_digits[:, 16:20]
+    chars[:, 24:36] = hex_digits[:, 20:32]
+    return chars.view("S36").ravel().astype(str).astype(object)
+
+
+def generate_participant_pool(n, race_dist=None, gender_dist=None, age_range=(18, 65), seed=None):
+    """
+    Draw a participant pool with vectorized NumPy sampling.
+
+    Args:
+        n: number of participants.
+        race_dist: dict mapping race category to weight. Keys may be the full
+            census labels (keys of `allowed_races`) or the short labels; None = balanced.
+        gender_dist: dict mapping gender to weight; None = balanced.
+        age_range: (min_age, max_age), both inclusive.
+        seed: int or np.random.Generator for reproducible pools.
+
+    Returns:
+        pd.DataFrame with columns ParticipantID, Race, Gender, Age.
+    """
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    age_min, age_max = age_range
+    if age_min > age_max:
+        raise ValueError("Minimum age must not exceed maximum age.")
+    if race_dist is not None:
+        race_dist = {allowed_races.get(k, k): v for k, v in race_dist.items()}
+    race_labels = list(allowed_races.values())
+    race_p = _normalize_distribution(race_dist, race_labels, "race")
+    gender_p = _normalize_distribution(gender_dist, allowed_genders, "gender")
+
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    return pd.DataFrame({
+        "ParticipantID": _uuid4_strings(rng, n),
+        "Race": _sample_categories(rng, race_labels, race_p, n),
+        "Gender": _sample_categories(rng, allowed_genders, gender_p, n),
+        "Age": rng.integers(age_min, age_max + 1, size=n),
+    })
+
+
+def allocate_quotas(weights, n):
+    """
+    Split `n` participants across strata in proportion to `weights`.
+
+    Uses largest-remainder apportionment, so the quotas sum to exactly `n`
+    and each differs from its expected count by less than one.
+
+    Returns:
+        np.ndarray of int64 quotas, one per stratum.
+    """
+    weights = np.asarray(weights, dtype=float)
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Stratum weights must be non-negative and sum to a positive value")
+    expected = weights / weights.sum() * n
+    quotas = np.floor(expected).astype(np.int64)
+    shortfall = n - int(quotas.sum())
+    if shortfall:
+        quotas[np.argsort(-(expected - quotas), kind="stable")[:shortfall]] += 1
+    return quotas
+
+
+def generate_stratified_pool(n, joint_table, weight_col="weight", age_range=(18, 65), seed=None):
+    """
+    Draw a participant pool that hits the quotas of a joint distribution table.
+
+    `joint_table` has one row per stratum (e.g. a census cross-tab): any
+    attribute columns (Race, Gender, Income, Education, Region, ...) plus a
+    `weight_col` holding counts or proportions. Each stratum receives an
+    exact quota (see `allocate_quotas`) and the pool is shuffled. Every
+    attribute column becomes a participant column that the prompt template
+    can reference as a $placeholder (e.g. $income, $region).
+
+    Age is taken from an "Age" column if present, otherwise drawn uniformly
+    from an "AgeMin"/"AgeMax" band per stratum, otherwise from `age_range`.
+
+    Args:
+        n: number of participants.
+        joint_table: pd.DataFrame or path to a CSV file.
+        weight_col: column with stratum weights.
+        age_range: (min_age, max_age) used when the table has no age columns.
+        seed: int or np.random.Generator for reproducible pools.
+
+    Returns:
+        pd.DataFrame with ParticipantID, the table's attribute columns and Age.
+    """
+    if isinstance(joint_table, str):
+        joint_table = pd.read_csv(joint_table)
+    if weight_col not in joint_table.columns:
+        raise ValueError(f"Joint distribution table has no '{weight_col}' column")
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+    quotas = allocate_quotas(joint_table[weight_col].to_numpy(), n)
+    strata = rng.permutation(np.repeat(np.arange(len(joint_table)), quotas))
+    attributes = joint_table.drop(columns=[weight_col]).reset_index(drop=True)
+
+    pool = attributes.drop(columns=["AgeMin", "AgeMax"], errors="ignore").iloc[strata].reset_index(drop=True)
+    if "Age" not in pool.columns:
+        if {"AgeMin", "AgeMax"} <= set(attributes.columns):
+            low = attributes["AgeMin"].to_numpy(dtype=np.int64)[strata]
+            high = attributes["AgeMax"].to_numpy(dtype=np.int64)[strata]
+        else:
+            low = np.full(n, age_range[0], dtype=np.int64)
+            high = np.full(n, age_range[1], dtype=np.int64)
+        pool["Age"] = low + np.floor(rng.random(n) * (high - low + 1)).astype(np.int64)
+    pool.insert(0, "ParticipantID", _uuid4_strings(rng, n))
+    return pool
+
+
+def write_participant_pool(output_path, n, race_dist=None, gender_dist=None, age_range=(18, 65),
+                           seed=None, chunk_size=1_000_000):
+    """
+    Generate a participant pool and write it to CSV or Parquet in chunks.
+
+    Only `chunk_size` rows are held in memory at a time, so pools larger than
+    memory can be written. The format follows the file extension
+    (".parquet" needs pyarrow; anything else is written as CSV).
+
+    Args:
+        output_path: destination file.
+        n, race_dist, gender_dist, age_range, seed: see `generate_participant_pool`.
+        chunk_size: rows generated and written per chunk.
+
+    Returns:
+        output_path
+    """
+    rng = np.random.default_rng(seed)
+    parquet = output_path.endswith(".parquet")
+    writer = None
+    if parquet:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet requires pyarrow (pip install pyarrow).")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    # An empty pool still gets written once so the file has a header.
+    sizes = [min(chunk_size, n - start) for start in range(0, n, chunk_size)] or [0]
+    try:
+        for i, size in enumerate(sizes):
+            chunk = generate_participant_pool(size, race_dist, gender_dist, age_range, seed=rng)
+            if parquet:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(output_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    return output_path
+
+
 def prompt_with_default(prompt: str, default, caster):
     """Prompt user with a default; empty input returns default."""
     raw = input(f"{prompt} (default: {default}): ").strip()
@@ -37,100 +228,87 @@ def prompt_with_default(prompt: str, default, caster):
         return default
 
 
-# === Step 2: Get yes/no for race distribution ===
-print("Do you want a balanced race distribution among the five races?")
-for k, v in allowed_races.items():
-    print(f"  {k} -> {v}")
-
-use_balanced = prompt_with_default(
-    "Enter 'yes' for balanced or 'no' to specify custom percentages",
-    default="yes",
-    caster=lambda s: s.lower()
-)
-use_balanced = "yes" if use_balanced not in ["yes", "no"] else use_balanced
-
-# === Step 3: Get race percentages ===
-if use_balanced == 'yes':
-    race_dist = {k: 1.0 / len(allowed_races) for k in allowed_races}
-else:
-    print("\nPlease enter race percentages (0 - 100). Press Enter to accept default 20% each.")
-    race_raw = {}
-    for label in allowed_races:
+def main():
+    """Interactive wrapper around `write_participant_pool`."""
+    # === Step 2: Get yes/no for race distribution ===
+    print("Do you want a balanced race distribution among the five races?")
+    for k, v in allowed_races.items():
+        print(f"  {k} -> {v}")
+
+    use_balanced = prompt_with_default(
+        "Enter 'yes' for balanced or 'no' to specify custom percentages",
+        default="yes",
+        caster=lambda s: s.lower()
+    )
+    use_balanced = "yes" if use_balanced not in ["yes", "no"] else use_balanced
+
+    # === Step 3: Get race percentages ===
+    if use_balanced == 'yes':
+        race_dist = {k: 1.0 / len(allowed_races) for k in allowed_races}
+    else:
+        print("\nPlease enter race percentages (0 - 100). Press Enter to accept default 20% each.")
+        race_raw = {}
+        for label in allowed_races:
+            percent = prompt_with_default(
+                f"How much percentage do you want for {allowed_races[label]}?",
+                default=100.0 / len(allowed_races),
+                caster=float,
+            )
+            if percent < 0:
+                print("Negative value provided. Using 0.")
+                percent = 0.0
+            race_raw[label] = percent
+        total = sum(race_raw.values())
+        if abs(total - 100) > 1e-2 and total > 0:
+            print("Percentages do not sum to 100. Normalizing automatically...")
+        race_dist = {k: (v / total if total > 0 else 1.0 / len(allowed_races)) for k, v in race_raw.items()}
+
+    # === Step 4: Get gender percentages ===
+    print("\nPlease enter gender percentages (0 - 100). Press Enter to accept default 50/50.")
+    gender_raw = {}
+    for gender in allowed_genders:
         percent = prompt_with_default(
-            f"How much percentage do you want for {allowed_races[label]}?",
-            default=100.0 / len(allowed_races),
+            f"How much percentage do you want for {gender}?",
+            default=100.0 / len(allowed_genders),
             caster=float,
         )
         if percent < 0:
             print("Negative value provided. Using 0.")
             percent = 0.0
-        race_raw[label] = percent
-    total = sum(race_raw.values())
+        gender_raw[gender] = percent
+    total = sum(gender_raw.values())
     if abs(total - 100) > 1e-2 and total > 0:
         print("Percentages do not sum to 100. Normalizing automatically...")
-    race_dist = {k: (v / total if total > 0 else 1.0 / len(allowed_races)) for k, v in race_raw.items()}
-
-# === Step 4: Get gender percentages ===
-print("\nPlease enter gender percentages (0 - 100). Press Enter to accept default 50/50.")
-gender_raw = {}
-for gender in allowed_genders:
-    percent = prompt_with_default(
-        f"How much percentage do you want for {gender}?",
-        default=100.0 / len(allowed_genders),
-        caster=float,
-    )
-    if percent < 0:
-        print("Negative value provided. Using 0.")
-        percent = 0.0
-    gender_raw[gender] = percent
-total = sum(gender_raw.values())
-if abs(total - 100) > 1e-2 and total > 0:
-    print("Percentages do not sum to 100. Normalizing automatically...")
-gender_dist = {k: (v / total if total > 0 else 1.0 / len(allowed_genders)) for k, v in gender_raw.items()}
-
-# === Step 5: Age range ===
-while True:
-    age_min = prompt_with_default("\nEnter minimum age", default=18, caster=int)
-    age_max = prompt_with_default("Enter maximum age", default=65, caster=int)
-    if age_min >= age_max:
-        print("Minimum age must be less than maximum age.")
-        continue
-    break
-
-# === Step 6: Number of participants ===
-while True:
-    num_participants = prompt_with_default("\nEnter number of participants to generate", default=42, caster=int)
-    if num_participants <= 0:
-        print("Number must be positive.")
-        continue
-    break
-
-# === Step 7: Generate participants ===
-participants = []
-for _ in range(num_participants):
-    participant_id = str(uuid.uuid4())
-    race_key = random.choices(list(race_dist.keys()), weights=race_dist.values())[0]
-    race = allowed_races[race_key]
-    gender = random.choices(list(gender_dist.keys()), weights=gender_dist.values())[0]
-    age = random.randint(age_min, age_max)
-
-    participants.append({
-        'ParticipantID': participant_id,
-        'Race': race,
-        'Gender': gender,
-        'Age': age
-    })
+    gender_dist = {k: (v / total if total > 0 else 1.0 / len(allowed_genders)) for k, v in gender_raw.items()}
 
-# === Step 8: Save to CSV ===
-df = pd.DataFrame(participants)
+    # === Step 5: Age range ===
+    while True:
+        age_min = prompt_with_default("\nEnter minimum age", default=18, caster=int)
+        age_max = prompt_with_default("Enter maximum age", default=65, caster=int)
+        if age_min >= age_max:
+            print("Minimum age must be less than maximum age.")
+            continue
+        break
 
-# Get directory where the current script is located
-script_dir = os.path.dirname(os.path.abspath(__file__))
+    # === Step 6: Number of participants ===
+    while True:
+        num_participants = prompt_with_default("\nEnter number of participants to generate", default=42, caster=int)
+        if num_participants <= 0:
+            print("Number must be positive.")
+            continue
+        break
+
+    # === Step 7: Generate participants and save to CSV ===
+    output_path = write_participant_pool(
+        DEFAULT_OUTPUT_PATH,
+        num_participants,
+        race_dist=race_dist,
+        gender_dist=gender_dist,
+        age_range=(age_min, age_max),
+    )
 
-# Create full path for CSV file
-output_path = os.path.join(script_dir, "participant_pool.csv")
+    print(f"\nParticipant pool saved to: {output_path}")
 
-# Save the file
-df.to_csv(output_path, index=False)
 
-print(f"\nParticipant pool saved to: {output_path}")
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ from datetime import datetime
 from typing import Literal, Dict, List, Any, Union, Optional
 import io
 import time
+import numpy as np
 import pandas as pd
 import logging
 import re
@@ -32,7 +33,15 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from llm_openai import openai_llm
+from rate_limit import TokenBucket, run_coroutine_sync
+from survey_prompt import CompiledSurveyPrompt, compile_survey_prompt_json, compile_survey_prompt_str
+from answer_parser import AnswerParser, ReaskQueue
+from response_matrix import MISSING_INT16
 from tqdm import tqdm
+import concurrent.futures
+
+# Default number of LLM requests in flight, shared by the sync and async runners.
+DEFAULT_MAX_CONCURRENCY = 8
 
 
 def run_single_survey_response_json(llm, survey_prompt_template, survey_context, participant_info):
@@ -40,7 +49,7 @@ def run_single_survey_response_json(llm, survey_prompt_template, survey_context,
     Generate a single survey response using LLM.
 
     Args:
-        llm: callable that takes in a prompt and returns a response.
+        llm: callable that takes in a prompt and returns a response (e.g. an LLMBackend).
         survey_prompt_template: str with placeholders like $age, $gender, $race.
         survey_context: json string with survey context. Contains questions and instructions.
         participant_info: dict with keys "name", "age", "gender", "race".
@@ -48,55 +57,103 @@ def run_single_survey_response_json(llm, survey_prompt_template, survey_context,
     Returns:
         dict with participant info and response text.
     """
-    background_prompt = survey_prompt_template.replace("$age", str(participant_info["Age"])) \
-                                          .replace("$gender", participant_info["Gender"]) \
-                                          .replace("$race", participant_info["Race"])
-    survey_context = json.loads(survey_context)
-    # combine the background prompt with the survey context to let the LLM response
-    questions = survey_context["questions"]
-    prompt_body = "\n".join([
-        f"Q{i+1}: {q['question_text']}\nOptions: {', '.join(q['input_config']['options'])}"
-        for i, q in enumerate(questions)
-    ])
-    full_prompt = f"{background_prompt}\n\nSurvey Theme: {survey_context['theme']}\nPurpose: {survey_context['purpose']}\n\nPlease answer the following questions in JSON format:\n\n{prompt_body}"
-
+    full_prompt = build_survey_prompt_json(survey_prompt_template, survey_context, participant_info)
     response = llm(full_prompt)
-    return {
-        "ParticipantID": participant_info["ParticipantID"],
-        "Age": participant_info["Age"],
-        "Gender": participant_info["Gender"],
-        "Race": participant_info["Race"],
-        "Response": response
-    }
+    return _response_record(participant_info, response)
+
+
+def build_survey_prompt_json(survey_prompt_template, survey_context, participant_info):
+    """
+    Build the full LLM prompt for one participant from a JSON survey context.
+
+    Args:
+        survey_prompt_template: str with placeholders like $age, $gender, $race.
+        survey_context: json string with survey context. Contains questions and instructions.
+        participant_info: dict with keys "Age", "Gender", "Race".
+
+    Returns:
+        str prompt.
+    """
+    return compile_survey_prompt_json(survey_prompt_template, survey_context).render(participant_info)
 
 
-def run_all_survey_responses_json(llm, participant_csv_path, survey_prompt_template, survey_context):
+RECORD_COLUMNS = ("ParticipantID", "Age", "Gender", "Race")
+
+
+def _response_record(participant_info, response):
+    """
+    Row of the simulation output DataFrame for one participant: the core
+    columns first, then any extra pool attributes (Income, Region, ...).
+    """
+    record = {key: participant_info[key] for key in RECORD_COLUMNS if key in participant_info}
+    record.update((key, value) for key, value in participant_info.items() if key not in record)
+    record["Response"] = response
+    return record
+
+
+def run_all_survey_responses_json(llm, participant_csv_path, survey_prompt_template, survey_context,
+                                  max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None, batch_size=1,
+                                  sink=None, limiter=None):
     """
     Run the survey across all participants listed in the CSV.
 
     Args:
-        llm: callable that returns LLM response.
+        llm: callable that returns LLM response, e.g. openai_llm or any LLMBackend.
         participant_csv_path: path to participant CSV file.
         survey_prompt_template: string with placeholders.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+        batch_size: number of participants answered per LLM request (1 = one request per participant).
+        sink: optional JsonlResponseSink; completed records are streamed to it and
+            participants already in it are skipped.
 
     Returns:
         pd.DataFrame with all responses.
     """
-    df_participants = pd.read_csv(participant_csv_path)
-    responses = []
-
-    for _, row in tqdm(df_participants.iterrows(), total=len(df_participants)):
-        participant_info = {
-            "ParticipantID": row["ParticipantID"],
-            "Age": row["Age"],
-            "Gender": row["Gender"],
-            "Race": row["Race"]
-        }
-        response_record = run_single_survey_response_json(
-            llm, survey_prompt_template, survey_context, participant_info
-        )
-        responses.append(response_record)
+    return _run_sync(llm, run_all_survey_responses_json_async(
+        llm, participant_csv_path, survey_prompt_template, survey_context,
+        max_concurrency=max_concurrency, requests_per_second=requests_per_second,
+        batch_size=batch_size, sink=sink, limiter=limiter
+    ))
+
+
+async def run_all_survey_responses_json_async(llm, participant_csv_path, survey_prompt_template, survey_context,
+                                              max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None,
+                                              batch_size=1, sink=None, limiter=None):
+    """
+    Async version of `run_all_survey_responses_json` that keeps up to
+    `max_concurrency` LLM requests in flight.
+
+    With `batch_size` > 1, personas are packed N at a time into one request
+    and the reply is split into N answer objects. Personas whose answers are
+    missing or invalid are re-asked with a single-persona request. Their
+    Response is the JSON answer object, same as in single-persona mode.
+    The llm must allow enough output tokens for N answer objects.
 
+    Args:
+        llm: callable, coroutine function or LLMBackend that returns LLM response.
+        participant_csv_path: path to participant CSV file.
+        survey_prompt_template: string with placeholders.
+        survey_context: json string with survey context.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+        batch_size: number of participants answered per LLM request.
+        sink: optional JsonlResponseSink; completed records are streamed to it and
+            participants already in it are skipped.
+
+    Returns:
+        pd.DataFrame with all responses, in participant CSV order.
+    """
+    participants = _load_participants(participant_csv_path)
+    responses = await _run_participants_async(
+        llm, participants,
+        compile_survey_prompt_json(survey_prompt_template, survey_context),
+        max_concurrency, requests_per_second, batch_size, sink, limiter
+    )
     return pd.DataFrame(responses)
 
 
@@ -106,7 +163,7 @@ def run_single_survey_response_str(llm, survey_prompt_template, survey_str, part
     Generate a single survey response using LLM.
 
     Args:
-        llm: callable that takes in a prompt and returns a response.
+        llm: callable that takes in a prompt and returns a response (e.g. an LLMBackend).
         survey_prompt_template: str with placeholders like $age, $gender, $race.
         survey_str: string with survey context. Contains questions and instructions.
         participant_info: dict with keys "name", "age", "gender", "race".
@@ -114,48 +171,380 @@ def run_single_survey_response_str(llm, survey_prompt_template, survey_str, part
     Returns:
         dict with participant info and response text.
     """
-    background_prompt = survey_prompt_template.replace("$age", str(participant_info["Age"])) \
-                                          .replace("$gender", participant_info["Gender"]) \
-                                          .replace("$race", participant_info["Race"])
-    question = survey_str
-    # combine the background prompt with the survey context to let the LLM response
-    full_prompt = f"{background_prompt}\n\nPlease answer the following question by replying ONLY the corresponding number of your choice:\n\n{question}"
-
+    full_prompt = build_survey_prompt_str(survey_prompt_template, survey_str, participant_info)
     response = llm(full_prompt)
-    return {
-        "ParticipantID": participant_info["ParticipantID"],
-        "Age": participant_info["Age"],
-        "Gender": participant_info["Gender"],
-        "Race": participant_info["Race"],
-        "Response": response
-    }
+    return _response_record(participant_info, response)
 
 
-def run_all_survey_responses_str(llm, participant_csv_path, survey_prompt_template, survey_str):
+def build_survey_prompt_str(survey_prompt_template, survey_str, participant_info):
+    """
+    Build the full LLM prompt for one participant from a plain-text question.
+
+    Args:
+        survey_prompt_template: str with placeholders like $age, $gender, $race.
+        survey_str: string with survey context. Contains questions and instructions.
+        participant_info: dict with keys "Age", "Gender", "Race".
+
+    Returns:
+        str prompt.
+    """
+    return compile_survey_prompt_str(survey_prompt_template, survey_str).render(participant_info)
+
+
+def run_all_survey_responses_str(llm, participant_csv_path, survey_prompt_template, survey_str,
+                                 max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None, sink=None,
+                                 limiter=None):
     """
     Run the survey across all participants listed in the CSV.
 
     Args:
-        llm: callable that returns LLM response.
+        llm: callable that returns LLM response, e.g. openai_llm or any LLMBackend.
         participant_csv_path: path to participant CSV file.
         survey_prompt_template: string with placeholders.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+        sink: optional JsonlResponseSink; completed records are streamed to it and
+            participants already in it are skipped.
 
     Returns:
         pd.DataFrame with all responses.
     """
-    df_participants = pd.read_csv(participant_csv_path)
-    responses = []
-
-    for _, row in tqdm(df_participants.iterrows(), total=len(df_participants)):
-        participant_info = {
-            "ParticipantID": row["ParticipantID"],
-            "Age": row["Age"],
-            "Gender": row["Gender"],
-            "Race": row["Race"] 
+    participants = _load_participants(participant_csv_path)
+    responses = _run_sync(llm, _run_participants_async(
+        llm, participants,
+        compile_survey_prompt_str(survey_prompt_template, survey_str),
+        max_concurrency, requests_per_second, sink=sink, limiter=limiter
+    ))
+    return pd.DataFrame(responses)
+
+
+# ========== Multiple samples per persona ==========
+
+# Unanswered cells in the int16 sample arrays; the same sentinel as ResponseMatrix.
+MISSING_ANSWER = MISSING_INT16
+
+
+def run_all_survey_samples_json(llm, participant_csv_path, survey_prompt_template, survey_context, n_samples=5,
+                                max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None, limiter=None):
+    """
+    Draw `n_samples` independent answers per participant, one request each.
+
+    Backends with a multi-completion API (OpenAI's `n`) return all samples
+    from a single request; others fall back to one request per sample.
+
+    Args:
+        llm: callable, coroutine function or LLMBackend that returns LLM response.
+        participant_csv_path: path to participant CSV file.
+        survey_prompt_template: string with placeholders.
+        survey_context: json string (or dict) with survey context.
+        n_samples: number of samples per participant.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+
+    Returns:
+        (participants, samples): pd.DataFrame of participants and an int16
+        array of shape (participants, questions, n_samples) holding the
+        1-based option numbers; unanswered cells are MISSING_ANSWER.
+    """
+    if n_samples < 1:
+        raise ValueError("n_samples must be at least 1")
+    participants = _load_participants(participant_csv_path)
+    compiled_prompt = compile_survey_prompt_json(survey_prompt_template, survey_context)
+    responses = _run_sync(llm, _sample_participants_async(
+        llm, participants, compiled_prompt, n_samples, max_concurrency, requests_per_second, limiter
+    ))
+    samples = responses_to_sample_array(AnswerParser(compiled_prompt.questions), responses)
+    return pd.DataFrame(participants), samples
+
+
+async def _sample_participants_async(llm, participants, compiled_prompt, n_samples, max_concurrency,
+                                     requests_per_second, limiter=None):
+    caller = _LimitedCaller(llm, max_concurrency, requests_per_second, limiter)
+    progress = tqdm(total=len(participants))
+
+    async def run_one(info):
+        responses = await caller.ask_n(compiled_prompt.render(info), n_samples)
+        progress.update(1)
+        return responses
+
+    try:
+        return await asyncio.gather(*(run_one(info) for info in participants))
+    finally:
+        progress.close()
+        caller.close()
+
+
+def responses_to_sample_array(parser, responses):
+    """
+    Parse per-participant lists of raw responses into an int16 array of shape
+    (participants, questions, samples). Numeric answers are rounded; missing,
+    invalid and non-numeric (text/checkbox) answers are MISSING_ANSWER.
+    """
+    n_samples = max((len(r) for r in responses), default=0)
+    samples = np.full((len(responses), len(parser.keys), n_samples), MISSING_ANSWER, dtype=np.int16)
+    for p, participant_responses in enumerate(responses):
+        for s, raw in enumerate(participant_responses):
+            answers, _ = parser.parse(raw)
+            for q, key in enumerate(parser.keys):
+                value = answers.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    samples[p, q, s] = round(value)
+    return samples
+
+
+def sample_statistics(samples):
+    """
+    Per-question summary of a (participants, questions, samples) answer array.
+
+    Returns:
+        dict of arrays of length n_questions: "count" (valid answers), "mean",
+        "within_var" (mean over participants of the variance across their own
+        samples, i.e. LLM sampling noise) and "between_var" (variance of the
+        participants' mean answers).
+    """
+    values = np.where(samples == MISSING_ANSWER, np.nan, samples.astype(np.float64))
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        persona_mean = np.nanmean(values, axis=2)
+        persona_var = np.where(counts > 1, np.nanvar(values, axis=2, ddof=1), np.nan)
+        return {
+            "count": valid.sum(axis=(0, 2)),
+            "mean": np.nanmean(values, axis=(0, 2)),
+            "within_var": np.nanmean(persona_var, axis=0),
+            "between_var": np.nanvar(persona_mean, axis=0, ddof=1),
         }
-        response_record = run_single_survey_response_str(
-            llm, survey_prompt_template, survey_str, participant_info
-        )
-        responses.append(response_record)
 
-    return pd.DataFrame(responses)
\ No newline at end of file
+
+# ========== Selective re-ask of missing/invalid answers ==========
+
+def repair_missing_answers(llm, survey_prompt_template, survey_context, participants, answers, reask_queue,
+                           max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None, max_rounds=2,
+                           limiter=None):
+    """
+    Re-ask only the missing or invalid questions of each participant and merge
+    the valid answers back. The full survey is never regenerated.
+
+    Args:
+        llm: callable, coroutine function or LLMBackend that returns LLM response.
+        survey_prompt_template: string with placeholders.
+        survey_context: json string (or dict) with survey context.
+        participants: participant_info dicts indexed like `answers` (a list, or a dict
+            holding only the rows in `reask_queue`).
+        answers: parsed answers, updated in place: a list of answer dicts (from
+            AnswerParser.parse_many) or a dict of answer columns (from postprocess.parse_responses).
+        reask_queue: ReaskQueue from AnswerParser.parse_many.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+        max_rounds: number of follow-up rounds before giving up on a cell.
+
+    Returns:
+        (answers, remaining): the merged answers and a ReaskQueue of cells still invalid.
+    """
+    compiled_prompt = compile_survey_prompt_json(survey_prompt_template, survey_context)
+    parser = AnswerParser(compiled_prompt.questions)
+    return _run_sync(llm, _repair_async(
+        llm, compiled_prompt, parser, participants, answers, reask_queue,
+        max_concurrency, requests_per_second, max_rounds, limiter
+    ))
+
+
+async def _repair_async(llm, compiled_prompt, parser, participants, answers, reask_queue,
+                        max_concurrency, requests_per_second, max_rounds, limiter=None):
+    caller = _LimitedCaller(llm, max_concurrency, requests_per_second, limiter)
+    try:
+        for _ in range(max_rounds):
+            if not len(reask_queue):
+                break
+            items = list(reask_queue)
+            responses = await asyncio.gather(*(
+                caller.ask(compiled_prompt.render_followup(participants[index], list(problems)))
+                for index, _, problems in items
+            ))
+            reask_queue = ReaskQueue()
+            for (index, participant_id, problems), response in zip(items, responses):
+                fixed, _ = parser.parse(response)
+                still_invalid = {}
+                for key, reason in problems.items():
+                    if key in fixed:
+                        if isinstance(answers, dict):
+                            answers[key][index] = fixed[key]
+                        else:
+                            answers[index][key] = fixed[key]
+                    else:
+                        still_invalid[key] = reason
+                if still_invalid:
+                    reask_queue.add(index, participant_id, still_invalid)
+    finally:
+        caller.close()
+    return answers, reask_queue
+
+
+# ========== Concurrent simulation engine ==========
+
+def _load_participants(participant_csv_path):
+    """
+    Read the participant pool into a list of participant_info dicts.
+
+    Every column is kept, so extra attributes from a stratified pool can be
+    referenced as $placeholders in the prompt template.
+    """
+    df_participants = pd.read_csv(participant_csv_path)
+    return df_participants.to_dict(orient="records")
+
+
+async def _run_participants_async(llm, participants, compiled_prompt, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                  requests_per_second=None, batch_size=1, sink=None, limiter=None):
+    """
+    Query the LLM for every participant while keeping at most
+    `max_concurrency` requests in flight.
+
+    Args:
+        llm: callable, coroutine function or LLMBackend that returns LLM response.
+        participants: list of participant_info dicts.
+        compiled_prompt: CompiledSurveyPrompt for the survey.
+        max_concurrency: maximum number of LLM requests in flight at once.
+        requests_per_second: optional token-bucket rate limit on LLM requests.
+        limiter: optional AdaptiveConcurrencyLimiter; its AIMD window replaces
+            `max_concurrency` and throttled requests are retried.
+        batch_size: number of participants answered per LLM request.
+        sink: optional JsonlResponseSink receiving each record as it completes.
+            Participants already in the sink are not queried again.
+
+    Returns:
+        list of response records, in the same order as `participants`.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    caller = _LimitedCaller(llm, max_concurrency, requests_per_second, limiter)
+    ask = caller.ask
+    done = dict(sink.records) if sink is not None else {}
+    pending = [info for info in participants if info["ParticipantID"] not in done]
+    progress = tqdm(total=len(participants), initial=len(participants) - len(pending))
+
+    def finish(info, response):
+        record = _response_record(info, response)
+        if sink is not None:
+            sink.append(record)
+        progress.update(1)
+        return record
+
+    async def run_one(info):
+        response = await ask(compiled_prompt.render(info))
+        return [finish(info, response)]
+
+    async def run_batch(batch):
+        if len(batch) == 1:
+            return await run_one(batch[0])
+        response = await ask(compiled_prompt.render_batch(batch))
+        answers = compiled_prompt.split_batch_response(response, len(batch))
+        # Personas the batched reply did not answer validly fall back to single requests.
+        fallbacks = await asyncio.gather(*(
+            run_one(info) for info, answer in zip(batch, answers) if answer is None
+        ))
+        fallbacks = iter(fallbacks)
+        records = []
+        for info, answer in zip(batch, answers):
+            if answer is None:
+                records.extend(next(fallbacks))
+            else:
+                records.append(finish(info, json.dumps(answer)))
+        return records
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    try:
+        results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        new_records = iter([record for records in results for record in records])
+        return [
+            done[info["ParticipantID"]] if info["ParticipantID"] in done else next(new_records)
+            for info in participants
+        ]
+    finally:
+        progress.close()
+        caller.close()
+
+
+class _LimitedCaller:
+    """
+    Issues LLM requests with at most `max_concurrency` in flight and an
+    optional token-bucket rate limit.
+
+    With an AdaptiveConcurrencyLimiter, its window replaces the fixed
+    `max_concurrency` and throttled requests are retried by the limiter.
+    """
+
+    def __init__(self, llm, max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=None, limiter=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.llm = llm
+        self.limiter = limiter
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        # Blocking LLM callables get their own pool so the default executor size does not cap concurrency.
+        workers = limiter.max_limit if limiter is not None else max_concurrency
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    async def ask(self, prompt):
+        return await self._limited(_call_llm_async, self.llm, prompt, self.executor)
+
+    async def ask_n(self, prompt, n):
+        return await self._limited(_call_llm_n_async, self.llm, prompt, n, self.executor)
+
+    async def _limited(self, fn, *args):
+        if self.limiter is not None:
+            return await self.limiter.call(self._paced, fn, *args)
+        async with self.semaphore:
+            return await self._paced(fn, *args)
+
+    async def _paced(self, fn, *args):
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        return await fn(*args)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+async def _call_llm_async(llm, prompt, executor=None):
+    """
+    Await `llm(prompt)`: backends with an `acomplete` coroutine are awaited
+    natively, other blocking callables run in a worker thread.
+    """
+    if hasattr(llm, "acomplete"):
+        return await llm.acomplete(prompt)
+    if asyncio.iscoroutinefunction(llm):
+        return await llm(prompt)
+    return await asyncio.get_running_loop().run_in_executor(executor, llm, prompt)
+
+
+async def _call_llm_n_async(llm, prompt, n, executor=None):
+    """
+    Await `n` samples of `prompt`: through `acomplete_n`/`complete_n` when the
+    llm offers them (one request for n samples), else `n` separate calls.
+    """
+    if hasattr(llm, "acomplete_n"):
+        return await llm.acomplete_n(prompt, n)
+    if hasattr(llm, "complete_n"):
+        return await asyncio.get_running_loop().run_in_executor(executor, llm.complete_n, prompt, n)
+    return list(await asyncio.gather(*(_call_llm_async(llm, prompt, executor) for _ in range(n))))
+
+
+def _run_sync(llm, coro):
+    """
+    run_coroutine_sync(coro), then close the llm's async client (backends
+    with `aclose`), whose connections belong to the loop that is ending.
+    """
+    async def run():
+        try:
+            return await coro
+        finally:
+            if hasattr(llm, "aclose"):
+                await llm.aclose()
+    return run_coroutine_sync(run())
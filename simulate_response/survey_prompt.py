@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+'''
+Survey prompt compiled once and rendered per participant.
+'''
+
+import functools
+import json
+import re
+
+from answer_parser import AnswerParser
+
+PLACEHOLDER_PATTERN = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+
+BATCH_HEADER = (
+    "You will answer the survey below separately for each of the {n} respondents described here. "
+    "Answer for each respondent independently, as that person would."
+)
+FOLLOWUP_INSTRUCTIONS = (
+    "Some of your previous answers were missing or invalid. Answer ONLY the questions below. "
+    "Return ONE JSON object with exactly these keys ({keys}) and your chosen option NUMBER as each value."
+)
+BATCH_FOOTER = (
+    "Return ONE JSON object whose keys are the respondent labels ({labels}) and whose values are "
+    "that respondent's answer object as specified above, e.g. "
+    '{{"P1": {{"Q1": 2, "Q2": 5}}, "P2": {{"Q1": 1, "Q2": 3}}}}. '
+    "Include every respondent and every question. Do not write anything outside the JSON object."
+)
+
+
+class CompiledSurveyPrompt:
+    """
+    Survey prompt whose static part is parsed and rendered once.
+
+    The participant template is split into literal segments and `$placeholder`
+    names at compile time; `render` fills the placeholders from a participant
+    row in a single pass and appends the pre-rendered survey body. Placeholder
+    names match participant columns case-insensitively ($age -> "Age");
+    placeholders without a matching column are left untouched.
+
+    Use `from_json` or `from_str` to build one.
+    """
+
+    def __init__(self, survey_prompt_template, survey_body, questions=None, theme=None):
+        self.survey_prompt_template = survey_prompt_template
+        self.survey_body = survey_body
+        self.questions = questions
+        self.theme = theme
+        self._question_lines = {
+            f"Q{i+1}": _question_line(i, q) for i, q in enumerate(questions or [])
+        }
+        self._parser = None
+        self._literals = []
+        self._fields = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(survey_prompt_template):
+            self._literals.append(survey_prompt_template[position:match.start()])
+            self._fields.append(match.group(1))
+            position = match.end()
+        self._literals.append(survey_prompt_template[position:])
+
+    @classmethod
+    def from_json(cls, survey_prompt_template, survey_context):
+        """
+        Compile a prompt for a JSON survey.
+
+        Args:
+            survey_prompt_template: str with placeholders like $age, $gender, $race.
+            survey_context: json string (or dict) with theme, purpose and questions.
+        """
+        if isinstance(survey_context, str):
+            survey_context = json.loads(survey_context)
+        questions = survey_context["questions"]
+        prompt_body = "\n".join([_question_line(i, q) for i, q in enumerate(questions)])
+        body = f"\n\nSurvey Theme: {survey_context['theme']}\nPurpose: {survey_context['purpose']}\n\nPlease answer the following questions in JSON format:\n\n{prompt_body}"
+        return cls(survey_prompt_template, body, questions, survey_context['theme'])
+
+    @classmethod
+    def from_str(cls, survey_prompt_template, survey_str):
+        """
+        Compile a prompt for a single plain-text question.
+
+        Args:
+            survey_prompt_template: str with placeholders like $age, $gender, $race.
+            survey_str: string with the question and its numbered choices.
+        """
+        body = f"\n\nPlease answer the following question by replying ONLY the corresponding number of your choice:\n\n{survey_str}"
+        return cls(survey_prompt_template, body)
+
+    @property
+    def placeholders(self):
+        """Placeholder names referenced by the template, in order of appearance."""
+        return list(self._fields)
+
+    def render_background(self, participant_info):
+        """Render only the participant template, without the survey body."""
+        values = {str(key).lower(): value for key, value in participant_info.items()}
+        parts = [self._literals[0]]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            value = values.get(field.lower())
+            parts.append("$" + field if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+    def render(self, participant_info):
+        """
+        Build the full prompt for one participant.
+
+        Args:
+            participant_info: dict of participant attributes, e.g. "Age", "Gender", "Race".
+
+        Returns:
+            str prompt.
+        """
+        return self.render_background(participant_info) + self.survey_body
+
+    def render_followup(self, participant_info, question_keys):
+        """
+        Build a compact follow-up prompt that re-asks only `question_keys`
+        (e.g. ["Q3", "Q7"]) for one participant, keeping their Qk numbering.
+        """
+        if self.questions is None:
+            raise ValueError("Follow-up prompts require a JSON survey (use CompiledSurveyPrompt.from_json)")
+        lines = "\n".join(self._question_lines[key] for key in question_keys)
+        keys = ", ".join(f'"{key}"' for key in question_keys)
+        return (
+            f"{self.render_background(participant_info).strip()}\n\n"
+            f"Survey Theme: {self.theme}\n\n"
+            f"{FOLLOWUP_INSTRUCTIONS.format(keys=keys)}\n\n{lines}"
+        )
+
+    def render_batch(self, participants):
+        """
+        Build one prompt that asks for the answers of several participants.
+
+        Respondents are labelled P1..PN in the order given; the LLM is asked to
+        return a single JSON object mapping each label to its answer object.
+        Only JSON surveys (built with `from_json`) support batching.
+
+        Args:
+            participants: list of participant_info dicts.
+
+        Returns:
+            str prompt.
+        """
+        if self.questions is None:
+            raise ValueError("Batched prompts require a JSON survey (use CompiledSurveyPrompt.from_json)")
+        blocks = [
+            f"[P{i+1}]\n{self.render_background(info).strip()}"
+            for i, info in enumerate(participants)
+        ]
+        labels = ", ".join(f'"P{i+1}"' for i in range(len(participants)))
+        return (
+            BATCH_HEADER.format(n=len(participants)) + "\n\n"
+            + "\n\n".join(blocks)
+            + self.survey_body + "\n\n"
+            + BATCH_FOOTER.format(labels=labels)
+        )
+
+    def split_batch_response(self, response, n_participants):
+        """
+        Split a response to `render_batch` into per-participant answer dicts.
+
+        Each respondent's answers are validated with AnswerParser: every
+        question must have a valid answer. Respondents that are missing or
+        invalid come back as None so the caller can fall back to a
+        single-participant request.
+
+        Returns:
+            list of dict or None, one entry per participant.
+        """
+        if self._parser is None:
+            self._parser = AnswerParser(self.questions)
+        parsed = AnswerParser.extract(response)
+        results = []
+        for i in range(n_participants):
+            answers = parsed.get(f"P{i+1}")
+            if not isinstance(answers, dict):
+                results.append(None)
+                continue
+            answers, problems = self._parser.parse(answers)
+            results.append(None if problems else answers)
+        return results
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_json_str(survey_prompt_template, survey_context):
+    return CompiledSurveyPrompt.from_json(survey_prompt_template, survey_context)
+
+
+def compile_survey_prompt_json(survey_prompt_template, survey_context):
+    """
+    CompiledSurveyPrompt.from_json, compiled once per (template, survey JSON
+    string) and reused; a dict survey_context is compiled on every call.
+    """
+    if isinstance(survey_context, str):
+        return _compile_json_str(survey_prompt_template, survey_context)
+    return CompiledSurveyPrompt.from_json(survey_prompt_template, survey_context)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_survey_prompt_str(survey_prompt_template, survey_str):
+    """CompiledSurveyPrompt.from_str, compiled once per (template, question string) and reused."""
+    return CompiledSurveyPrompt.from_str(survey_prompt_template, survey_str)
+
+
+def _question_line(i, question):
+    """Prompt line for question i (0-based), e.g. "Q1: ...\nOptions: a, b"."""
+    return f"Q{i+1}: {question['question_text']}\nOptions: {', '.join(question['input_config']['options'])}"
@@ -6,27 +6,36 @@ import asyncio
 import tempfile
 import shutil
 import copy
+import hashlib
 import logging
 from datetime import datetime
 from typing import Literal, Dict, List, Any, Union, Optional
 from pydantic import BaseModel, ValidationError, Field, field_validator
-from crewai import Agent, Task, Crew, Process
-from knowledge_sources import (
-    initial_crew_knowledge,
-    enhancement_crew_knowledge,
-    paper_crew_knowledge,
-    attach_knowledge_to_crew,
-)
-from crewai.tasks.task_output import OutputFormat
+from lazy_import import lazy_import
+
+# Heavy dependencies are imported on first use, keeping server/CLI startup fast
+# (see benchmarks/bench_import_time.py).
+Agent = lazy_import("crewai", "Agent")
+Task = lazy_import("crewai", "Task")
+Crew = lazy_import("crewai", "Crew")
+Process = lazy_import("crewai", "Process")
+OutputFormat = lazy_import("crewai.tasks.task_output", "OutputFormat")
+# knowledge_sources builds the PDF knowledge base when it is imported.
+knowledge_sources = lazy_import("knowledge_sources")
 
 import sys
 # Add the parent directory of 'simulate_response' to the Python path
 # This ensures that 'from llm_openai import openai_llm' in simulate_response.py works correctly
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'simulate_response')))
 
-from simulate_response import run_all_survey_responses_json
+from simulate_response import run_all_survey_responses_json, repair_missing_answers, DEFAULT_MAX_CONCURRENCY
 from llm_openai import openai_llm
-from debias.debias import run_debias_pipeline
+from llm_backends import OpenAIBackend
+from llm_cache import CachedLLM, ResponseCache
+from response_sink import JsonlResponseSink
+from postprocess import parse_responses, queued_participants
+from response_matrix import ResponseMatrix
+run_debias_pipeline = lazy_import("debias.debias", "run_debias_pipeline")
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 
@@ -39,7 +48,7 @@ import zipfile
 import io
 import time
 import pandas as pd
-import boto3
+boto3 = lazy_import("boto3")
 from dotenv import load_dotenv
 import re
 import subprocess
@@ -427,11 +436,11 @@ Your tasks:
             verbose=True,
         )
         try:
-            initial_crew = Crew(knowledge=initial_crew_knowledge, **_crew_kwargs)
+            initial_crew = Crew(knowledge=knowledge_sources.initial_crew_knowledge, **_crew_kwargs)
         except TypeError:
             # Older CrewAI without 'knowledge' kwarg
             initial_crew = Crew(**_crew_kwargs)
-            attach_knowledge_to_crew(initial_crew, initial_crew_knowledge)
+            knowledge_sources.attach_knowledge_to_crew(initial_crew, knowledge_sources.initial_crew_knowledge)
 
         print("\n=== Running Initial Survey Processing ===")
         crew_result = initial_crew.kickoff(inputs=task_inputs)
@@ -733,10 +742,10 @@ Your tasks:
                     verbose=True,
                 )
                 try:
-                    enhancement_crew = Crew(knowledge=enhancement_crew_knowledge, **_enh_kwargs)
+                    enhancement_crew = Crew(knowledge=knowledge_sources.enhancement_crew_knowledge, **_enh_kwargs)
                 except TypeError:
                     enhancement_crew = Crew(**_enh_kwargs)
-                    attach_knowledge_to_crew(enhancement_crew, enhancement_crew_knowledge)
+                    knowledge_sources.attach_knowledge_to_crew(enhancement_crew, knowledge_sources.enhancement_crew_knowledge)
                 
                 print("\n=== Running AI Enhancement ===")
                 # We no longer need a complex input dictionary, as everything is in the task description.
@@ -1981,42 +1990,63 @@ def collect_simulated_data():
         survey_context_for_simulation = json.dumps(simulation_context_dict)
 
         print("Initializing LLM...")
-        llm = openai_llm
+        backend = OpenAIBackend()
+        cache = ResponseCache()
+        llm = CachedLLM(backend, cache)
 
         # ---- run simulation ----
+        # Completed participants are checkpointed so an interrupted run resumes where it stopped.
+        run_key = hashlib.sha256(
+            (survey_template + survey_context_for_simulation + os.path.abspath(participant_csv_path)).encode("utf-8")
+        ).hexdigest()[:12]
+        checkpoint_path = f"simulated_survey_responses.{run_key}.jsonl"
         print("Running survey simulation...")
-        responses_df = run_all_survey_responses_json(
-            llm=llm,
-            participant_csv_path=participant_csv_path,
-            survey_prompt_template=survey_template,
-            survey_context=survey_context_for_simulation
-        )
+        with JsonlResponseSink(checkpoint_path) as sink:
+            if sink.records:
+                print(f"Resuming from {checkpoint_path}: {len(sink.records)} participants already completed.")
+            responses_df = run_all_survey_responses_json(
+                llm=llm,
+                participant_csv_path=participant_csv_path,
+                survey_prompt_template=survey_template,
+                survey_context=survey_context_for_simulation,
+                max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                sink=sink
+            )
+        os.remove(checkpoint_path)
 
         # ---- parse the Response column into a DataFrame qdf ----
         if 'Response' not in responses_df.columns:
             raise KeyError("Expected 'Response' column in simulation output")
-        parsed = []
-        for resp in responses_df['Response']:
-            if isinstance(resp, str):
-                try:
-                    parsed.append(json.loads(resp))
-                except json.JSONDecodeError:
-                    # Handle cases where the response is not valid JSON
-                    print(f"Warning: Could not parse JSON from LLM response: {resp}")
-                    parsed.append({}) # Append empty dict to avoid errors later
-            else:
-                parsed.append(resp)  # already dict
-        qdf = pd.DataFrame(parsed)
-
         # ---- load question definitions ----
         question_defs = simulation_context_dict.get("questions")
         if not question_defs:
             # This is a fallback check; the logic above should have already handled this.
             raise ValueError("No questions found in the processed survey context JSON.")
 
+        # Extract answers from fenced/chatty/truncated output and validate them against each question.
+        parsed, reask_queue = parse_responses(
+            question_defs, responses_df['Response'].tolist(), responses_df['ParticipantID'].tolist()
+        )
+        if len(reask_queue):
+            # Re-prompt only the missing/invalid questions of those participants.
+            print(f"Re-asking missing/invalid answers for {len(reask_queue)} participants: "
+                  f"{reask_queue.question_counts()}")
+            parsed, reask_queue = repair_missing_answers(
+                llm, survey_template, simulation_context_dict,
+                queued_participants(responses_df, reask_queue),
+                parsed, reask_queue, max_concurrency=DEFAULT_MAX_CONCURRENCY
+            )
+        if len(reask_queue):
+            print(f"Warning: {len(reask_queue)} responses still have missing/invalid answers: "
+                  f"{reask_queue.question_counts()}")
+        print(f"LLM backend calls: {backend.stats.summary()}")
+        print(f"LLM response cache: {cache.stats()}")
+        cache.close()
+        matrix = ResponseMatrix.from_columns(parsed, responses_df['ParticipantID'].to_numpy())
+
         # ---- build the output list ----
         output_list = []
-        total_llms = len(qdf)
+        total_llms = matrix.n_participants
         for idx, q in enumerate(question_defs):
             q_text = q["question_text"].strip()
             opts   = q.get("input_config", {}).get("options", [])
@@ -2024,10 +2054,15 @@ def collect_simulated_data():
             prompt = f"{q_text} Choices: {choices_str}"
 
             col = f"Q{idx+1}"
-            if col not in qdf.columns:
+            # Invalid answers were reported above; only valid ones go to the debias step.
+            if col in matrix.question_ids:
+                answers = matrix.responses(col).tolist()
+            elif col in matrix.other_answers:
+                # text/checkbox answers are kept beside the numeric matrix
+                answers = [answer for answer in matrix.other_answers[col].tolist() if answer is not None]
+            else:
                 print(f"Warning: Column '{col}' not found in simulated responses. Skipping question.")
                 continue # Skip this question if the column doesn't exist
-            answers = qdf[col].tolist()
 
             output_list.append({
                 "Question": prompt,
@@ -2262,10 +2297,10 @@ def generate_research_paper():
         verbose=True,
     )
     try:
-        paper_crew = Crew(knowledge=paper_crew_knowledge, **_paper_kwargs)
+        paper_crew = Crew(knowledge=knowledge_sources.paper_crew_knowledge, **_paper_kwargs)
     except TypeError:
         paper_crew = Crew(**_paper_kwargs)
-        attach_knowledge_to_crew(paper_crew, paper_crew_knowledge)
+        knowledge_sources.attach_knowledge_to_crew(paper_crew, knowledge_sources.paper_crew_knowledge)
 
     print("\n Kicking off the Research Paper Generation Crew... This may take several minutes.")
     result = paper_crew.kickoff()
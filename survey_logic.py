@@ -6,24 +6,37 @@ import yaml
 import json
 import warnings
 import asyncio
-import tempfile
 import shutil
 import copy
 import logging
 from datetime import datetime
 from typing import Literal, Dict, List, Any, Union, Optional
 from pydantic import BaseModel, ValidationError, Field, field_validator
-from crewai import Agent, Task, Crew, Process
-from crewai.tasks.task_output import OutputFormat
+from lazy_import import lazy_import
+
+# Heavy dependencies are imported on first use, keeping server/CLI startup fast
+# (see benchmarks/bench_import_time.py).
+Agent = lazy_import("crewai", "Agent")
+Task = lazy_import("crewai", "Task")
+Crew = lazy_import("crewai", "Crew")
+Process = lazy_import("crewai", "Process")
+OutputFormat = lazy_import("crewai.tasks.task_output", "OutputFormat")
 
 import sys
 # Add the parent directory of 'simulate_response' to the Python path
 # This ensures that 'from llm_openai import openai_llm' in simulate_response.py works correctly
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'simulate_response')))
 
-from simulate_response import run_all_survey_responses_json
+from simulate_response import run_all_survey_responses_json, repair_missing_answers, DEFAULT_MAX_CONCURRENCY
 from llm_openai import openai_llm
-from debias.debias import run_debias_pipeline
+from llm_backends import LLMBackend, OpenAIBackend
+from llm_cache import CachedLLM, ResponseCache, DEFAULT_CACHE_PATH
+from response_sink import JsonlResponseSink
+from postprocess import parse_responses, queued_participants
+from response_matrix import ResponseMatrix
+from rate_limit import AdaptiveConcurrencyLimiter
+run_debias_pipeline = lazy_import("debias.debias", "run_debias_pipeline")
+get_debiaser = lazy_import("debias.debias", "get_debiaser")
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 
@@ -36,7 +49,7 @@ import zipfile
 import io
 import time
 import pandas as pd
-import boto3
+boto3 = lazy_import("boto3")
 from dotenv import load_dotenv
 import re
 import subprocess
@@ -717,11 +730,24 @@ class QualtricsAndMTurkAutomation:
         return pd.DataFrame(interleaved_data)
         
 # ========== Simulated Data Collection ==========
-def collect_simulated_data(template_path: str, survey_context_path: str, participant_csv_path: str) -> pd.DataFrame:
+def collect_simulated_data(template_path: str, survey_context_path: str, participant_csv_path: str,
+                           max_concurrency: int = DEFAULT_MAX_CONCURRENCY, cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                           batch_size: int = 1, checkpoint_path: Optional[str] = None,
+                           backend: Optional[LLMBackend] = None,
+                           adaptive_concurrency: bool = False) -> ResponseMatrix:
     """
-    Runs the data simulation and returns a DataFrame of the raw simulated responses.
+    Runs the data simulation and returns the parsed answers as a ResponseMatrix
+    (participants x questions; use `.to_dataframe()` for a Q1, Q2, ... DataFrame).
+    `backend` is the LLMBackend to query (default: OpenAIBackend with OPENAI_API_KEY).
+    `max_concurrency` bounds the number of LLM requests in flight at once; `batch_size` > 1
+    packs that many personas into each request.
+    If `checkpoint_path` is given, completed records are streamed to that JSONL file and a
+    rerun after a crash skips the participants already in it.
+    LLM responses are cached in the SQLite file at `cache_path` (None disables the cache).
+    With `adaptive_concurrency`, an AIMD limiter (up to `max_concurrency`) adjusts the number
+    of requests in flight from 429/timeout/5xx and latency feedback.
     """
-    if not all([run_all_survey_responses_json, openai_llm]):
+    if not all([run_all_survey_responses_json, OpenAIBackend]):
         raise ImportError("Simulation dependencies are not installed.")
     
     with open(template_path, "r") as f:
@@ -732,65 +758,78 @@ def collect_simulated_data(template_path: str, survey_context_path: str, partici
     survey_json = json.loads(survey_context_string)
     sim_context = survey_json.get('revised_survey', survey_json)
     
-    responses_df = run_all_survey_responses_json(
-        llm=openai_llm, 
-        participant_csv_path=participant_csv_path,
-        survey_prompt_template=survey_template, 
-        survey_context=json.dumps(sim_context)
+    # Throttling must reach the adaptive limiter rather than be retried inside the SDK.
+    backend = backend or OpenAIBackend(max_retries=0 if adaptive_concurrency else 2)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=min(4, max_concurrency),
+                                         max_limit=max_concurrency) if adaptive_concurrency else None
+    cache = ResponseCache(cache_path) if cache_path else None
+    llm = CachedLLM(backend, cache) if cache else backend
+
+    sink = JsonlResponseSink(checkpoint_path) if checkpoint_path else None
+    try:
+        responses_df = run_all_survey_responses_json(
+            llm=llm,
+            participant_csv_path=participant_csv_path,
+            survey_prompt_template=survey_template,
+            survey_context=json.dumps(sim_context),
+            max_concurrency=max_concurrency,
+            batch_size=batch_size,
+            sink=sink,
+            limiter=limiter
+        )
+    finally:
+        if sink:
+            sink.close()
+    # The 'Response' column contains the raw LLM answers; extract and validate them
+    # in parallel chunks, straight into answer columns
+    answer_columns, reask_queue = parse_responses(
+        sim_context['questions'], responses_df['Response'].tolist(), responses_df['ParticipantID'].tolist()
+    )
+    if len(reask_queue):
+        logger.info(f"Re-asking missing/invalid answers for {len(reask_queue)} participants: "
+                    f"{reask_queue.question_counts()}")
+        answer_columns, reask_queue = repair_missing_answers(
+            llm, survey_template, sim_context, queued_participants(responses_df, reask_queue),
+            answer_columns, reask_queue, max_concurrency=max_concurrency, limiter=limiter
+        )
+    if len(reask_queue):
+        logger.warning(f"{len(reask_queue)} simulated responses still have missing/invalid answers: "
+                       f"{reask_queue.question_counts()}")
+    logger.info(f"LLM backend calls: {backend.stats.summary()}")
+    if limiter:
+        logger.info(f"Adaptive concurrency: {limiter.metrics()}")
+    if cache:
+        logger.info(f"LLM response cache: {cache.stats()}")
+        cache.close()
+
+    # Pack the answer columns into a ResponseMatrix (no per-row conversion)
+    return ResponseMatrix.from_columns(
+        answer_columns, responses_df['ParticipantID'].to_numpy(),
+        question_texts=[q['question_text'] for q in sim_context['questions']]
     )
-    
-    # The 'Response' column contains JSON strings of answers, parse them
-    parsed_responses = [json.loads(resp) if isinstance(resp, str) else resp for resp in responses_df['Response']]
-    
-    # Convert the list of dictionaries into a DataFrame
-    results_df = pd.DataFrame(parsed_responses)
-    
-    return results_df
 
-def debias_simulated_data(simulated_data_df: pd.DataFrame, survey_context: dict) -> pd.DataFrame:
+def debias_simulated_data(simulated_data: Union[ResponseMatrix, pd.DataFrame], survey_context: dict) -> pd.DataFrame:
     """
-    Applies the debiasing pipeline to a DataFrame of simulated responses.
-    This function now restructures the data to the format expected by the pipeline.
+    Applies the debiasing pipeline to simulated responses, given as a ResponseMatrix
+    or as a DataFrame with Q1, Q2, ... answer columns.
     """
     if not run_debias_pipeline:
         raise ImportError("Debias pipeline dependency is not installed.")
 
     logger.info("Running debias pipeline on simulated data...")
 
-    # Restructure the data to match the format expected by the debias pipeline.
-    # Expected format: [{"Question": "text", "Answers": [...]}, ...]
     questions = survey_context.get('revised_survey', survey_context).get('questions', [])
-    pipeline_input_data = []
-    
-    # Assuming the answer columns in the DataFrame are named Q1, Q2, Q3...
-    for i, q_data in enumerate(questions):
-        # The column name for answers corresponds to the question index.
-        answer_col_name = f"Q{i + 1}"
-        if answer_col_name in simulated_data_df.columns:
-            pipeline_input_data.append({
-                "Question": q_data["question_text"],
-                "Answers": simulated_data_df[answer_col_name].tolist()
-            })
-    
-    # The debias pipeline requires file paths for both input and output.
-    with tempfile.NamedTemporaryFile(mode='w+', delete=True, suffix='.json', encoding='utf-8') as tmp_input_file, \
-         tempfile.NamedTemporaryFile(mode='w+', delete=True, suffix='.json', encoding='utf-8') as tmp_output_file:
-        
-        input_filepath = tmp_input_file.name
-        output_filepath = tmp_output_file.name
+    matrix = simulated_data if isinstance(simulated_data, ResponseMatrix) else \
+        ResponseMatrix.from_dataframe(simulated_data, [q["question_text"] for q in questions])
 
-        # 1. Save the newly structured data to the temporary input file.
-        json.dump(pipeline_input_data, tmp_input_file, indent=4)
-        tmp_input_file.flush() # Ensure data is written to disk before pipeline reads it
+    # Debias in memory with the process-wide model (loaded once, no files, no refit).
+    items = matrix.to_debias_items()
+    debiased = get_debiaser().debias(
+        [item["Question"] for item in items], [item["llm_resp"] for item in items]
+    )
+    debiased_df = pd.DataFrame(debiased)
 
-        # 2. Run the pipeline with the input and output file paths.
-        run_debias_pipeline(input_json=input_filepath, output_json=output_filepath)
-        
-        # 3. Read the debiased data back from the temporary output file.
-        debiased_df = pd.read_json(output_filepath, orient='records')
-        
-        logger.info("Debias pipeline complete.")
-        
+    logger.info("Debias pipeline complete.")
     return debiased_df
 
 